@@ -1,6 +1,6 @@
 import numpy as np
 from ..patch import Patch
-from ..parcel import Parcel
+from ..parcel import Parcel, DEVELOPMENT_TYPES
 
 class PropertyDeveloper:
     def __init__(self, world, agent_type, view_radius=5, memory=100):
@@ -10,33 +10,28 @@ class PropertyDeveloper:
         self.position = np.random.choice(world.patches.flatten()) # Starts in a random patch of the map
         self.dev_sites = [] # TO DO: initialize dev_sites using starting position
         self.dev_patches = []
-        self.considered_patches = []
+        self.considered_patches = set()
         self.agent_type = agent_type
 
-        # Weights for each type of developer
-        ##        eh  ev  epv  dw   dr  di  dpk dpr dm   x
+        # Weights for each type of developer. flat and smooth favour easy terrain (see terrain.terrainFeatureStage)
+        ##        eh  ev  epv  dw   dr  di  dpk dpr dm  flat smooth x
         self.W = {
-            "r": [.1, .2,  0,  .1,  .4,  0,  0,  .2,  0,  0],
-            "c": [ 0, .2,  0, .15, .15,  0,  0,  0, .4,  0],
-            "i": [ 0, .5,  0,  .3,   0, .1,  0, .1,  0,  0],
-            "p": [ 0,  0, .2,  .1,  .1,  0, .4,  0,  0, .2]
+            "r": [.1, .2,  0,  .1,  .4,  0,  0,  .2,  0,  .1,  .1,  0],
+            "c": [ 0, .2,  0, .15, .15,  0,  0,  0, .4,  .1, .05,  0],
+            "i": [ 0, .5,  0,  .3,   0, .1,  0, .1,  0,  .2,  .1,  0],
+            "p": [ 0,  0, .2,  .1,  .1,  0, .4,  0,  0,   0,   0, .2]
         }
 
     def getRegion(self, i, j):
-        region = self.world.patches[max(1,i-self.view_radius):i+self.view_radius, # Adding padding of 1 patch
-                         max(1, j-self.view_radius):j+self.view_radius].flatten()
-        region = [p for p in region if p.developable] # Selecting only developable patches (excludes water, etc)
+        # Adding padding of 1 patch. Only developable patches are selected (excludes water, etc)
+        region_patches, parcel_ids, parcel_types = self.world.getRegion((max(1,i-self.view_radius), i+self.view_radius),
+                                                                        (max(1, j-self.view_radius), j+self.view_radius))
 
-        region_parcels = []
-        region_patches = []
-        for patch in region:
-            if (patch.parcel == None):
-                region_patches.append(patch)
-            elif ( patch.parcel not in region_parcels and patch.parcel.development_type != self.agent_type): # Excludes parcels of same development type as the agent (TO DO: provisory)
-                region_parcels.append(patch.parcel)
-    
+        # Excludes parcels of same development type as the agent (TO DO: provisory)
+        other_types = parcel_types != DEVELOPMENT_TYPES.index(self.agent_type)
+        region_parcels = [self.world.parcel_table[parcel_id] for parcel_id in parcel_ids[other_types]]
 
-        return region_patches, region_parcels
+        return list(region_patches), region_parcels
 
 
     # Searches for suitable locations in its surroundings
@@ -88,36 +83,39 @@ class PropertyDeveloper:
         dev_sites = list(dev_patches) + dev_parcels        
         return dev_sites
 
+    # Patches avaliable to this agent's development type, best first (see World.getAvailability)
+    @property
+    def availability(self):
+        return self.world.getAvailability(self.agent_type, lambda patch: self.getScore(patch)[self.agent_type],
+                                          lambda: self.getScores()[self.agent_type])
+
+    # Patches are only considered once
+    def consider(self, patch):
+        self.considered_patches.add(patch)
+        self.availability.remove(patch)
+
     # Returns True if as build successfully and False otherwise
     def build(self, site):
         if (isinstance(site, Patch)): # Building in patch is direct
-            self.considered_patches.append(site)
-            new_parcel = self.world.createParcel(site, development_type=self.agent_type) # TO DO: expand to create parcels of multiple patches
-            if (new_parcel == None): 
-                return False
-            
-            for patch in new_parcel.patches:
-                # Preventing roads to be built on top of this patch
-                self.world.addBlockedPatch(patch)
-
-            return True
+            self.consider(site)
+            # Only created if roads can reach it, already blocked for roads
+            new_parcel = self.world.createParcel(site, development_type=self.agent_type, transactional=True)
+            return new_parcel != None
         return False
 
-    def getScore(self, patch):
-        i, j = [patch.i, patch.j] 
-        region_patches, region_parcels = self.getRegion(i, j)
+    # Score of a patch in the world, or in a snapshot of it (see World.fork)
+    def getScore(self, patch, world=None):
+        # Features are shared with the other agents, only the weighting is specific to this one
+        F = (world or self.world).score_cache.getFeatures(patch, self.view_radius)
 
-        eh = patch.get_eh(self.world.patches)
-        ev, epv = patch.get_ev(self.world.patches)
-        dpr = patch.get_dpr()
-        dw = patch.get_dw()
-        dr = patch.get_dr(region_patches, region_parcels)
-        dc = patch.get_dc(region_patches, region_parcels)
-        di = patch.get_di(region_patches, region_parcels)
-        dm = patch.get_dm(self.world.parcels)
-        dpk = patch.get_dm(self.world.parcels)
-
-        A = [eh, ev, epv, dw, dr, di, dpk, dpr, dm, 0]
+        # Densities exclude parcels of same development type as the agent (see getRegion)
+        counts = {t: n for t, n in F['parcels'].items() if t != self.agent_type}
+        total = F['free'] + sum(counts.values())
+        dr, dc, di = [counts.get(t, 0)/total if total != 0 else 0 for t in ['Vr', 'Vc', 'Vi']]
+        dpk = F['dm']
+
+        smooth = 1/(1 + F['roughness']) # 1 on level ground, lower the more the heights vary
+        A = [F['eh'], F['ev'], F['epv'], F['dw'], dr, di, dpk, F['dpr'], F['dm'], F['flatness'], smooth, 0]
         W = [self.W['r'], self.W['i'], self.W['i'], self.W['p']]
 
         Vr, Vc, Vi, _= np.dot(W, A) 
@@ -125,6 +123,27 @@ class PropertyDeveloper:
 
         return {'Vr': Vr, 'Vc': Vc, 'Vi': Vi, 'Vp': Vp}
 
+    # Scores of all the patches of the world at once, as arrays over the patch grid (same values as getScore)
+    def getScores(self):
+        F = self.world.score_cache.getFeatureGrids(self.view_radius)
+
+        counts = {t: n for t, n in F['parcels'].items() if t != self.agent_type}
+        total = F['free'] + sum(counts.values())
+        dr, dc, di = [np.divide(counts[t], total, out=np.zeros(total.shape), where=total != 0) if t in counts
+                      else np.zeros(total.shape) for t in ['Vr', 'Vc', 'Vi']]
+        dpk = F['dm']
+
+        smooth = 1/(1 + F['roughness'])
+        A = np.array([F['eh'], F['ev'], F['epv'], F['dw'], dr, di, dpk, F['dpr'], F['dm'], F['flatness'], smooth,
+                      np.zeros(total.shape)])
+        W = [self.W['r'], self.W['i'], self.W['i'], self.W['p']]
+
+        Vr, Vc, Vi, _ = np.tensordot(W, A, axes=1)
+        with np.errstate(divide='ignore'):
+            Vp = (1/Vr + 1/Vc + 1/Vi) * self.W['p'][-1] # Anti-worth
+
+        return {'Vr': Vr, 'Vc': Vc, 'Vi': Vi, 'Vp': Vp}
+
     def prospectNew(self):
         i, j = [self.position.i, self.position.j] 
         region_patches, region_parcels = self.getRegion(i, j)
@@ -132,12 +151,17 @@ class PropertyDeveloper:
         avaliable_patches = self.dev_patches + region_patches # Memory + new
         avaliable_patches = [p for p in avaliable_patches if p not in self.considered_patches and self.world.isAccessible(p)]
         
-        # No more avaliable patches, relocate globaly
-        while len(avaliable_patches) == 0:
-            self.position = np.random.choice(self.world.patches.flatten())
+        # No more avaliable patches, relocate globaly to the best avaliable one
+        if len(avaliable_patches) == 0:
+            best = self.availability.top(1)
+            if (len(best) == 0): # Map exhausted
+                return []
+            self.position = best[0]
             i, j = [self.position.i, self.position.j] 
             region_patches, region_parcels = self.getRegion(i, j)
             avaliable_patches = [p for p in region_patches if p not in self.considered_patches and self.world.isAccessible(p)]
+            if (len(avaliable_patches) == 0):
+                avaliable_patches = best
 
         scores = [self.getScore(patch)[self.agent_type] for patch in avaliable_patches]
 
@@ -148,28 +172,46 @@ class PropertyDeveloper:
 
         if (self.position == best_patch):
             self.build(self.position)
-            print("Building")
         else:
             self.position = best_patch
-            print("Relocating")
 
         return avaliable_patches
 
-    def buildNew(self):
-        avaliable_patches = [p for p in self.world.patches.flatten() if p.developable and p.undeveloped and p not in self.considered_patches]
-
-        # Scoring all patches and sorting them by score
-        scores = [self.getScore(p)[self.agent_type] for p in avaliable_patches]
-        sorted_idx = np.argsort(scores)[::-1]
-        sorted_patches = np.array(avaliable_patches)[sorted_idx]
-
-        # Triyng to build in the best score avaliable
-        built = False
-        for patch in sorted_patches:
-            # Checks if a patch is accessible
-            if(self.build(patch)):
+    # Best n avaliable patches (where a parcel fits), sorted from best to worst
+    def rankPatches(self, n=1):
+        return self.availability.top(n)
+
+    # Plans parcels for the best n patches without changing the world (safe to run alongside other agents)
+    def prospectParcels(self, n=5):
+        proposals = []
+        while (len(proposals) < n):
+            proposed = [site for site, plan in proposals]
+            candidates = [p for p in self.rankPatches(n) if p not in proposed]
+            if (len(candidates) == 0): # Map exhausted
                 break
 
+            for patch in candidates[:n - len(proposals)]:
+                plan = self.world.planParcel(patch)
+                if (plan == None):
+                    self.consider(patch)
+                    continue
+                proposals.append((patch, plan))
+        return proposals
+
+    # Tries to turn a planned parcel into a real one. Returns True if successful and False otherwise
+    def claim(self, site, plan):
+        self.consider(site)
+        new_parcel = self.world.claimParcel(*plan, development_type=self.agent_type, transactional=True)
+        return new_parcel != None # Another agent got to these patches first, or roads could not reach them
+
+    def buildNew(self):
+        # Triyng to build in the best score avaliable, until the map is exhausted
+        while True:
+            best = self.rankPatches(1)
+            if (len(best) == 0):
+                return False
+            if(self.build(best[0])):
+                return True
 
     # Interacts with the environment
     def interact(self):
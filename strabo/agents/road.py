@@ -1,9 +1,20 @@
 import numpy as np
 
+from ..roadnet import BUDGET_EXCEEDED
+
 class RoadDeveloper:
-    def __init__(self, world, explorers = 20):
+    ## With batched, all the exploration paths of a tick are found at once (see RoadNet.assignTraffic). With incremental,
+    ## explorations to the same parcel reuse its planner (see RoadNet.getPlanner) and the edges are marked once per tick,
+    ## and parcels are connected through the planner of the road network, kept for the whole run (see RoadNet.findConnection)
+    def __init__(self, world, explorers = 20, batched=False, incremental=False):
         self.world = world
         self.explorers = explorers
+        self.batched = batched
+        self.incremental = incremental
+
+        # Totals of the roads built to parcels and of the parcels destroyed for lack of access (see metrics.worldStats)
+        self.connected = 0
+        self.destroyed = 0
 
     # Gets the path between two patches using the road graph
     def getPath(self, patch1, patch2):
@@ -24,15 +35,37 @@ class RoadDeveloper:
         start_point = (start.i, start.j)
         end_point = (destination.i, destination.j)
 
-        path = self.world.road_graph.findPath(start_point, end_point)
+        path = self.world.road_graph.findPath(start_point, end_point, incremental=self.incremental)
         return path
 
 
+    # Explores the map between random parcels, increasing the speed of the edges used
+    def explore(self):
+        if (self.batched):
+            return self.exploreBatched()
+        paths = []
+        for i in range(self.explorers):
+            paths.append(self.runExplore())
+        if (self.incremental):
+            self.world.road_graph.useEdges(paths)
+
+    # Explores between random pairs of parcels, all at once. The cost grows with the number of distinct origins
+    def exploreBatched(self):
+        if (len(self.world.parcels) == 0): # Only proceed if those properties have already been developed
+            return []
+        starts = np.random.randint(len(self.world.parcels), size=self.explorers)
+        destinations = np.random.randint(len(self.world.parcels), size=self.explorers)
+        pairs = [((self.world.parcels[a].i, self.world.parcels[a].j), (self.world.parcels[b].i, self.world.parcels[b].j))
+                 for a, b in zip(starts, destinations)]
+        return self.world.road_graph.assignTraffic(pairs)
+
     # Runs an simulation tick with the world
     def interact(self):
-        for i in range(self.explorers):
-            path = self.runExplore()
+        self.explore()
+        self.connect()
 
+    # Builds roads to the parcels not connected to the network yet
+    def connect(self):
         # Implementation 1: build through all pairs
         ## Problema: tempo de execução
         '''
@@ -113,37 +146,46 @@ class RoadDeveloper:
         if (len(self.world.parcels) < 2):
             return
         
-        road_coords = [(p.i, p.j) for p in self.world.roads]
         inaccessible_parcels = [parcel for parcel in self.world.parcels if not parcel.connected]
         if (len(inaccessible_parcels)==0): # If no inaccessible parcels, return
             return
 
-        print("blocked",self.world.road_graph.blocked)
-        # Build all the reast connecting to the network
+        # Distances from the network to every patch, used to pick where each road starts
+        analytics = self.world.getRoadAnalytics()
+
+        # Build all the reast connecting to the network. Parcels whose search ran out of budget are kept for the next tick
+        pending = []
         for destination_parcel in inaccessible_parcels:
-            start_point_idx = np.random.randint(low=0, high=len(road_coords))
-            start_point = road_coords[start_point_idx]
-            end_point = (destination_parcel.i, destination_parcel.j)
             extra_goals = [(p.i, p.j) for p in destination_parcel.patches]
 
-            path = self.world.road_graph.findPath(start_point, end_point, extra_goals)
+            # Starting from the closest point in the network. Parcels no road can reach are not searched for
+            distance, start_point, goal = analytics.getApproach(extra_goals)
+            if (start_point == None):
+                continue
+            end_point = (destination_parcel.i, destination_parcel.j)
+
+            if (self.incremental): # From the whole network, repairing the search of the last parcel
+                road_positions = [(p.i, p.j) for p in self.world.roads]
+                path = self.world.road_graph.findConnection(extra_goals, road_positions)
+            else:
+                path = self.world.road_graph.findPath(start_point, end_point, extra_goals)
             path = path # Start and destination are not converted into roads
+            if (self.world.road_graph.last_search.status == BUDGET_EXCEEDED):
+                pending.append(destination_parcel)
+                continue
 
             self.world.road_graph.setRoad(path)
             self.world.registerRoad(path)
 
-            print(f"Path: {path}")
-            print(f"Roads: {road_coords}")
-
             # If parcel was reached, set it as connected
             if (len(path) != 0):
                 destination_parcel.connected = True
+                self.connected += 1
 
-        # If there is still an inaccessilble parcel, destroy it
-        road_coords = [(p.i, p.j) for p in self.world.roads]
-        inaccessible_parcels = [parcel for parcel in inaccessible_parcels if not parcel.connected]
+        # If there is still an inaccessilble parcel (shown to be unreachable), destroy it
+        inaccessible_parcels = [parcel for parcel in inaccessible_parcels if not parcel.connected and parcel not in pending]
         for parcel in inaccessible_parcels:
             self.world.destroyParcel(parcel)
-            print("destroying")
+            self.destroyed += 1
 
         self.world.road_graph.clearEdges()
\ No newline at end of file
@@ -0,0 +1,182 @@
+import gzip
+import mmap
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+
+SECTOR_SIZE = 4096
+CHUNKS_PER_TASK = 64 # Chunks decoded by each worker task
+
+# Unpacks the values of a packed long array (Minecraft 1.16+ format, values do not span two longs)
+def unpackLongs(longs, bits, count):
+    per_long = 64 // bits
+    longs = np.asarray(longs, dtype=np.int64).view(np.uint64)
+    shifts = np.arange(per_long, dtype=np.uint64) * np.uint64(bits)
+    values = (longs[:, None] >> shifts[None, :]) & np.uint64((1 << bits) - 1)
+    return values.reshape(-1)[:count].astype(np.int64)
+
+# Reads the (uncompressed) NBT data of a chunk from a memory-mapped region file. None if the chunk was never generated
+def readChunk(region, region_path, cx, cz):
+    location = int.from_bytes(region[4*((cx & 31) + (cz & 31)*32):4*((cx & 31) + (cz & 31)*32) + 4], 'big')
+    offset = (location >> 8) * SECTOR_SIZE
+    if (offset == 0):
+        return None
+
+    length = int.from_bytes(region[offset:offset + 4], 'big')
+    compression = region[offset + 4]
+    if (compression & 128): # Chunk too big for the region file, stored in its own file
+        with open(os.path.join(os.path.dirname(region_path), f"c.{cx}.{cz}.mcc"), 'rb') as f:
+            data = f.read()
+    else:
+        data = region[offset + 5:offset + 4 + length]
+
+    compression &= 127
+    if (compression == 1):
+        data = gzip.decompress(data)
+    elif (compression == 2):
+        data = zlib.decompress(data)
+    from nbt import nbt # Only loaded when a region file is read (see backends)
+    return nbt.NBTFile(buffer=BytesIO(data))
+
+# Heightmap and the top depth blocks of every column of a chunk (index 0 is the block right under the heightmap),
+## indexed [x, z] and [x, z, d]. Only the sections holding those blocks are decoded
+def decodeColumns(chunk, heightmap_type='MOTION_BLOCKING_NO_LEAVES', depth=1):
+    if ('Level' in chunk): # Minecraft 1.16 and 1.17
+        level = chunk['Level']
+        sections = level['Sections'] if 'Sections' in level else []
+        y_offset = 0
+        def getStates(section):
+            if ('Palette' not in section or 'BlockStates' not in section):
+                return None, None
+            return section['Palette'], section['BlockStates']
+    else: # Minecraft 1.18+, heightmaps are relative to the bottom of the world
+        level = chunk
+        sections = level['sections'] if 'sections' in level else []
+        y_offset = 16*level['yPos'].value if 'yPos' in level else -64
+        def getStates(section):
+            if ('block_states' not in section):
+                return None, None
+            states = section['block_states']
+            return states['palette'], states['data'] if 'data' in states else None
+
+    heightmap = np.zeros((16, 16), dtype=np.int64)
+    columns = np.full((16, 16, depth), 'minecraft:void_air', dtype=object)
+    if ('Heightmaps' not in level or heightmap_type not in level['Heightmaps']):
+        return heightmap, columns
+
+    heights = unpackLongs(level['Heightmaps'][heightmap_type].value, 9, 256) + y_offset
+    heightmap = heights.reshape(16, 16).T # Stored as z*16 + x
+
+    ys = heightmap[..., None] - 1 - np.arange(depth)
+    for section in sections:
+        section_y = section['Y'].value
+        in_section = (ys >> 4) == section_y
+        if (not in_section.any()):
+            continue
+
+        palette, data = getStates(section)
+        if (palette is None):
+            continue
+        names = np.array([block['Name'].value for block in palette], dtype=object)
+        if (data is None or len(data) == 0): # Single block section
+            columns[in_section] = names[0]
+            continue
+
+        bits = max(4, int(np.ceil(np.log2(len(palette)))))
+        states = unpackLongs(data.value, bits, 4096)
+        x, z, d = np.nonzero(in_section)
+        columns[x, z, d] = names[states[(ys[x, z, d] & 15)*256 + z*16 + x]]
+    return heightmap, columns
+
+# Heightmap and surface blocks (the blocks right under the heightmap) of a chunk, indexed [x, z]
+def decodeChunk(chunk, heightmap_type='MOTION_BLOCKING_NO_LEAVES'):
+    heightmap, columns = decodeColumns(chunk, heightmap_type)
+    return heightmap, columns[..., 0]
+
+# Copies the decoded arrays of chunk (cx, cz) into the arrays of an area starting at block (x1, z1)
+def pasteChunk(cx, cz, x1, z1, chunk_arrays, area_arrays):
+    width, length = area_arrays[0].shape[:2]
+    ax, az = cx*16 - x1, cz*16 - z1
+    x_range = slice(max(0, ax), min(width, ax + 16))
+    z_range = slice(max(0, az), min(length, az + 16))
+    chunk_range = (slice(x_range.start - ax, x_range.stop - ax), slice(z_range.start - az, z_range.stop - az))
+    for chunk_array, area_array in zip(chunk_arrays, area_arrays):
+        area_array[x_range, z_range] = chunk_array[chunk_range]
+
+# Decodes some chunks of a region file. Runs in worker processes, so it opens its own memory map
+def decodeChunks(region_path, chunks, heightmap_type, depth=1):
+    results = []
+    with open(region_path, 'rb') as f:
+        region = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for cx, cz in chunks:
+                chunk = readChunk(region, region_path, cx, cz)
+                if (chunk == None):
+                    continue
+                heightmap, columns = decodeColumns(chunk, heightmap_type, depth)
+                results.append((cx, cz, heightmap, columns))
+        finally:
+            region.close()
+    return results
+
+# Terrain of a saved world read directly from its region (.mca) files, used instead of a WorldSlice
+## Only the chunks overlapping the area are decoded, and only the heightmap and the top depth blocks of every column
+## are kept. Coordinates follow WorldSlice (x2 and z2 are exclusive, heightmaps have one extra row and column)
+class RegionSlice:
+    def __init__(self, path, x1, z1, x2, z2, heightmap_type='MOTION_BLOCKING_NO_LEAVES', processes=None, depth=1):
+        # Accepting either the world save folder or its region folder
+        self.region_dir = os.path.join(path, 'region') if os.path.isdir(os.path.join(path, 'region')) else path
+        self.rect = x1, z1, x2 - x1, z2 - z1
+        self.heightmap_type = heightmap_type
+        self.depth = depth
+
+        width, length = self.rect[2] + 1, self.rect[3] + 1
+        heightmap = np.zeros((width, length), dtype=np.int64)
+        self.column_blocks = np.full((width, length, depth), 'minecraft:void_air', dtype=object)
+
+        # Grouping the chunks that overlap the area by region file
+        tasks = []
+        for rx in range((x1 >> 4) >> 5, ((x1 + width - 1) >> 4 >> 5) + 1):
+            for rz in range((z1 >> 4) >> 5, ((z1 + length - 1) >> 4 >> 5) + 1):
+                region_path = os.path.join(self.region_dir, f"r.{rx}.{rz}.mca")
+                if (not os.path.exists(region_path)):
+                    continue
+                chunks = [(cx, cz) for cx in range(max(x1 >> 4, rx*32), min((x1 + width - 1) >> 4, rx*32 + 31) + 1)
+                                   for cz in range(max(z1 >> 4, rz*32), min((z1 + length - 1) >> 4, rz*32 + 31) + 1)]
+                for k in range(0, len(chunks), CHUNKS_PER_TASK):
+                    tasks.append((region_path, chunks[k:k + CHUNKS_PER_TASK], heightmap_type, depth))
+
+        # Small areas are not worth starting worker processes for
+        if (processes == 1 or len(tasks) <= 1):
+            results = [decodeChunks(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = list(executor.map(decodeChunks, *zip(*tasks)))
+
+        for result in results:
+            for cx, cz, chunk_heightmap, chunk_columns in result:
+                pasteChunk(cx, cz, x1, z1, (chunk_heightmap, chunk_columns), (heightmap, self.column_blocks))
+
+        self.heightmaps = {heightmap_type: heightmap}
+        self.surface_blocks = self.column_blocks[..., 0]
+
+    def __repr__(self):
+        x1, z1 = self.rect[:2]
+        x2, z2 = self.rect[0] + self.rect[2], self.rect[1] + self.rect[3]
+        return f"RegionSlice{(x1, z1, x2, z2)}"
+
+    # Returns the block's namespaced id. Only the top depth blocks of each column are loaded, others read as void air
+    def getBlockAt(self, x, y, z):
+        return getColumnBlock(self, x, y, z)
+
+# Block at (x, y, z) of a surface-only terrain source (see RegionSlice and surface.SurfaceSlice)
+def getColumnBlock(source, x, y, z):
+    i, j = x - source.rect[0], z - source.rect[1]
+    if (0 <= i < source.column_blocks.shape[0] and 0 <= j < source.column_blocks.shape[1]):
+        d = source.heightmaps[source.heightmap_type][i, j] - 1 - y
+        if (0 <= d < source.depth):
+            return source.column_blocks[i, j, d]
+    return "minecraft:void_air"
@@ -0,0 +1,87 @@
+import heapq
+
+# Developable, undeveloped patches not yet considered by the agents of a development type, kept in a priority queue by score.
+## Updates are lazy: removed patches are only dropped when they reach the top of the queue, and entries scored in an older
+## world version are rescored (and pushed back) when they reach the top. Scores that rose since a patch was last scored
+## are only seen once that patch is rescored, so the order is the one of the last scoring of each patch. Patches where no
+## parcel fits for now (see World.isFeasibleSeed) are set aside until the world changes, then queued again
+class AvailabilityIndex:
+    ## scores, if given, gives the scores of all patches at once (an array over the patch grid), used to build the queue
+    def __init__(self, world, score, scores=None):
+        self.world = world
+        self.score = score # Function giving the score of a patch
+        self.scores = scores
+        self.heap = None # Entries (-score, version, sequence, i, j), built on first use
+        self.entries = {} # Sequence of the current entry of each patch in the queue
+        self.removed = set() # Patches considered by the agents, never returned again
+        self.deferred = {} # Entries of the patches where no parcel fits in the world version deferred_version
+        self.deferred_version = None
+        self.sequence = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def isAvailable(self, patch):
+        return patch.developable and patch.undeveloped and (patch.i, patch.j) not in self.removed
+
+    def build(self):
+        self.heap = []
+        scores = self.scores() if self.scores != None else None
+        for patch in self.world.patches.flatten():
+            if (patch.developable and patch.undeveloped and (patch.i, patch.j) not in self.removed):
+                self.push(patch, scores[patch.i, patch.j] if scores is not None else None)
+
+    def push(self, patch, score=None):
+        self.sequence += 1
+        self.entries[(patch.i, patch.j)] = self.sequence
+        score = score if score != None else self.score(patch)
+        heapq.heappush(self.heap, (-score, self.world.version, self.sequence, patch.i, patch.j))
+
+    # Adds a patch back to the queue (e.g. land freed by a destroyed parcel). With restore, even if it was removed before
+    def add(self, patch, restore=True):
+        if (restore):
+            self.removed.discard((patch.i, patch.j))
+        key = (patch.i, patch.j)
+        if (self.heap != None and key not in self.entries and key not in self.removed and
+            patch.developable and patch.undeveloped):
+            self.push(patch)
+
+    # Removes a patch from the queue for good
+    def remove(self, patch):
+        self.removed.add((patch.i, patch.j))
+        self.entries.pop((patch.i, patch.j), None)
+
+    # Best k available patches, from best to worst. The queue is left unchanged, apart from dropping unavailable patches
+    def top(self, k=1):
+        if (self.heap == None):
+            self.build()
+        if (self.deferred_version != self.world.version): # Footprints may have changed, retrying the deferred patches
+            for entry in self.deferred.values():
+                heapq.heappush(self.heap, entry)
+            self.deferred = {}
+            self.deferred_version = self.world.version
+
+        best = []
+        while (len(self.heap) != 0 and len(best) < k):
+            entry = heapq.heappop(self.heap)
+            _, version, sequence, i, j = entry
+            if (self.entries.get((i, j)) != sequence): # Removed or replaced by a newer entry
+                continue
+
+            patch = self.world.patches[i, j]
+            if (not self.isAvailable(patch)):
+                del self.entries[(i, j)]
+            elif (not self.world.isFeasibleSeed(patch)):
+                self.deferred[(i, j)] = entry
+            elif (version != self.world.version): # Scored in an older world, rescoring
+                self.push(patch)
+            else:
+                best.append(entry)
+
+        for entry in best:
+            heapq.heappush(self.heap, entry)
+        return [self.world.patches[i, j] for _, _, _, i, j in best]
+
+    # True if no patch is available anymore
+    def exhausted(self):
+        return len(self.top(1)) == 0
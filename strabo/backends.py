@@ -0,0 +1,40 @@
+import json
+import subprocess
+import sys
+
+# Optional backends. The simulation core (World, RoadNet and the agents) only needs numpy and scipy; the modules below
+## are imported where they are used, so worker processes start without them:
+##  gdpc: GDMC I/O, loaded when a SurfaceSlice is read or blocks are placed (importing it contacts the server)
+##  nbt: chunk data, loaded when region files (anvil.RegionSlice) or chunks from the server (SurfaceSlice) are read
+##  cv2: terrain features, road rasterization and frame writing
+##  matplotlib: World.plotPatches
+##  tqdm: progress bars, skipped if not installed
+OPTIONAL_BACKENDS = ['gdpc', 'nbt', 'cv2', 'matplotlib', 'tqdm']
+
+# Wraps an iterable in a progress bar if tqdm is installed
+def progress(iterable, **kwargs):
+    try:
+        from tqdm import tqdm
+    except ImportError:
+        return iterable
+    return tqdm(iterable, **kwargs)
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+for module in sys.argv[2:]:
+    __import__(module)
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [m for m in json.loads(sys.argv[1]) if m in sys.modules]]))
+"""
+
+# Import time benchmark. Imports modules in a fresh interpreter (nothing cached from this one) and returns the time
+## taken (seconds) and the optional backends that were loaded with them, e.g. importTime('strabo.world')
+def importTime(*modules, repeat=3):
+    times, loaded = [], []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT, json.dumps(OPTIONAL_BACKENDS), *modules],
+                                capture_output=True, text=True, check=True).stdout
+        elapsed, loaded = json.loads(output.splitlines()[-1])
+        times.append(elapsed)
+    return min(times), loaded
@@ -0,0 +1,128 @@
+import numpy as np
+
+from .rasterize import rasterizeRoads
+
+# Block names as read from the world, so they can be compared with the surface snapshot
+def namespaced(block):
+    return block if ':' in block else 'minecraft:' + block
+
+ORIGINAL = None # Terrain under the ground as it was before any commit (see CommitPlanner.getColumnBlocks)
+
+# List of block placements, sorted by chunk
+class CommitPlan:
+    def __init__(self, x, y, z, blocks, layout, avoided):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.blocks = blocks
+        self.layout = layout # Full layout of the surface after this plan is committed
+        self.avoided = avoided # Writes skipped because the block was already there
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __iter__(self):
+        return zip(self.x.tolist(), self.y.tolist(), self.z.tolist(), self.blocks)
+
+# Plans commits of the world to Minecraft, writing only the blocks that differ from what is already there.
+## The first commit is compared against the surface snapshot taken when the world was built, the next ones
+## against the layout committed before (patches that stopped being developed are restored to the snapshot).
+## Roads are paved along corridors of road_width blocks with graded heights (see rasterize.rasterizeRoads): the terrain
+## above a road is cleared and the gap under it filled with fill_block
+class CommitPlanner:
+    def __init__(self, world, blocks=['oak_planks', 'dark_oak_planks', 'acacia_planks'], road_block='obsidian',
+                 road_width=3, fill_block='dirt'):
+        self.world = world
+        self.blocks = [namespaced(block) for block in blocks]
+        self.road_block = namespaced(road_block)
+        self.road_width = road_width
+        self.fill_block = namespaced(fill_block)
+        self.patch_blocks = {} # Block chosen for each developed patch, kept between commits
+        self.ground = world.HEIGHTMAP[:world.SURFACE_BLOCKS.shape[0], :world.SURFACE_BLOCKS.shape[1]] - 1 # Heightmap is the air block on top
+        self.current = world.SURFACE_BLOCKS.copy() # Layout currently in Minecraft
+        self.current_heights = self.ground.copy() # Height of every block of the layout
+
+    # Desired block layout of the surface (blocks and their heights), and which cells would be written by a full commit
+    def getLayout(self):
+        size = self.world.patch_size
+        layout = self.world.SURFACE_BLOCKS.copy()
+        heights = self.ground.copy()
+        targets = np.zeros(layout.shape, dtype=bool)
+
+        # Roads, limited to road patches
+        roads = np.array([[patch.type == "road" for patch in row] for row in self.world.patches])
+        i, j, y = rasterizeRoads(self.world.road_paths, self.ground + 1, size, width=self.road_width,
+                                 mask=np.kron(roads, np.ones((size, size), dtype=bool)))
+        layout[i, j] = self.road_block
+        heights[i, j] = y
+        targets[i, j] = True
+
+        for patch in self.world.patches.flatten():
+            if (patch.type == "road"):
+                continue
+            elif (patch.undeveloped == False):
+                if patch not in self.patch_blocks:
+                    self.patch_blocks[patch] = str(np.random.choice(self.blocks))
+                block = self.patch_blocks[patch]
+            else:
+                continue
+
+            cells = (slice(patch.i*size, (patch.i+1)*size), slice(patch.j*size, (patch.j+1)*size))
+            layout[cells] = block
+            targets[cells] = True
+        return layout, heights, targets
+
+    # Blocks of columns of the surface, at heights ys, given the height h of their top block (ground g, top block top
+    ## and ground block surface as in the snapshot): air over cuts and above the top, fill under raised cells, and
+    ## ORIGINAL for the untouched terrain under the top block and the ground
+    def getColumnBlocks(self, ys, h, g, top, surface):
+        blocks = np.full(len(ys), ORIGINAL, dtype=object)
+        blocks[ys > h] = 'minecraft:air'
+        blocks[(ys > g) & (ys < h)] = self.fill_block
+        blocks[(ys == g) & (h > g)] = surface[(ys == g) & (h > g)]
+        blocks[ys == h] = top[ys == h]
+        return blocks
+
+    def plan(self):
+        layout, heights, targets = self.getLayout()
+        changed = (layout != self.current) | (heights != self.current_heights)
+        i, j = np.nonzero(changed)
+
+        # Every changed column is planned between the ground, the committed height and the new height, so cells that
+        ## change height clear their old block (and its air or fill) as well
+        ground, old, new = self.ground[i, j], self.current_heights[i, j], heights[i, j]
+        lowest = np.minimum(ground, np.minimum(old, new))
+        counts = np.maximum(ground, np.maximum(old, new)) - lowest + 1
+        column = np.repeat(np.arange(len(i)), counts)
+        y = lowest[column] + np.arange(len(column)) - np.repeat(np.cumsum(counts) - counts, counts)
+        i, j = i[column], j[column]
+        surface = self.world.SURFACE_BLOCKS[i, j]
+        before = self.getColumnBlocks(y, old[column], ground[column], self.current[i, j], surface)
+        after = self.getColumnBlocks(y, new[column], ground[column], layout[i, j], surface)
+
+        # Writing only the blocks that differ. The terrain under a cell that is no longer cut can not be restored
+        ## (it was not read), so it is filled
+        write = before != after
+        i, j, y = i[write], j[write], y[write]
+        blocks = np.where(after[write] == ORIGINAL, self.fill_block, after[write]).astype(object)
+
+        x = self.world.STARTX + i
+        z = self.world.STARTZ + j
+
+        # Sorting by chunk, so writes to the same chunk are close together
+        order = np.lexsort((y, z, x, z >> 4, x >> 4))
+        avoided = int(np.count_nonzero(targets & ~changed))
+        return CommitPlan(x[order], y[order], z[order], blocks[order], (layout, heights), avoided)
+
+    # Registers a plan as written to Minecraft
+    def markCommitted(self, plan):
+        self.current, self.current_heights = plan.layout
+
+    # Writes a plan using the given placeBlock(x, y, z, block) function
+    def commit(self, placeBlock, plan=None):
+        if (plan == None):
+            plan = self.plan()
+        for x, y, z, block in plan:
+            placeBlock(x, y, z, block)
+        self.markCommitted(plan)
+        return plan
@@ -0,0 +1,161 @@
+import heapq
+import time
+
+import numpy as np
+
+from .roadnet import SearchResult, FOUND, UNREACHABLE, BUDGET_EXCEEDED
+
+# Incremental planner (D* Lite) for paths from any start to a set of goals in a RoadNet (see setGoals).
+## The search runs backwards from the goals and keeps its state between searches. The RoadNet tells the planner which
+## patches were blocked or unblocked and which edge bonuses changed (see RoadNet.getPlanner), and the next search only
+## repairs the part of the state these changes affect. Costs are the ones of the A* search (steps between neighbours,
+## entering blocked or steep patches only if they are goals). Edge bonuses have no upper bound, so there is no
+## admissible heuristic besides 0: the search is an incremental Dijkstra and its paths are shortest paths, with the
+## same cost as a fresh search of the whole graph (see RoadNet.getTrafficGraph)
+class DStarLite:
+    def __init__(self, road_graph, goals):
+        self.road_graph = road_graph
+        self.goals = set(goals)
+
+        self.g = {} # Cost to the goals of every settled position (infinite if not in the dict)
+        self.rhs = {} # One step lookahead of g
+        self.queue = [] # Heap of (key, position); entries whose key is not the one in queued are stale
+        self.queued = {}
+        self.changed = set() # Positions whose outgoing edges changed since the last search
+        self.steps = road_graph.getSteps()
+
+        for goal in self.goals:
+            self.rhs[goal] = 0
+            self.push(goal, 0)
+
+    # Cost of stepping from u to its neighbour v, given the distance between them and if v is too steep
+    def getCost(self, u, v, distance, steep):
+        if ((steep or v in self.road_graph.blocked) and v not in self.goals):
+            return np.inf
+        return distance/(1 + self.road_graph.edges.get((u, v), 0))
+
+    def getNeighbours(self, position):
+        return [neighbour for neighbour, distance, steep in self.steps[position]]
+
+    def push(self, position, key):
+        self.queued[position] = key
+        heapq.heappush(self.queue, (key, position))
+
+    # Smallest key in the queue, dropping stale entries
+    def topKey(self):
+        while (len(self.queue) != 0):
+            key, position = self.queue[0]
+            if (self.queued.get(position) == key):
+                return key
+            heapq.heappop(self.queue)
+        return np.inf
+
+    def updateVertex(self, u):
+        if (u not in self.goals):
+            self.rhs[u] = min([self.getCost(u, v, distance, steep) + self.g.get(v, np.inf)
+                               for v, distance, steep in self.steps[u]] + [np.inf])
+        g, rhs = self.g.get(u, np.inf), self.rhs.get(u, np.inf)
+        if (g != rhs):
+            self.push(u, min(g, rhs))
+        else:
+            self.queued.pop(u, None)
+
+    # Notifications from the RoadNet. Positions without a cost to the goals yet can not change the cost of the
+    ## positions stepping into them, so changes of the steps into them are skipped
+    def cellChanged(self, position):
+        # The cost of entering the patch changed for all its neighbours
+        if (position in self.g):
+            self.changed.update(self.getNeighbours(position))
+
+    def edgeChanged(self, u, v):
+        if (v in self.g):
+            self.changed.add(u)
+
+    # Replaces the goals (e.g. the road network after new roads are built). New goals cost 0, removed goals are
+    ## recomputed from their neighbours, and entering either may now be allowed or not (see getCost)
+    def setGoals(self, goals):
+        goals = set(goals)
+        for position in self.goals ^ goals:
+            self.cellChanged(position)
+            self.changed.add(position)
+        for position in self.goals - goals:
+            self.rhs.pop(position, None)
+        for position in goals - self.goals:
+            self.rhs[position] = 0
+        self.goals = goals
+
+    # Checks if the cost of the cheapest of the starts is known: no queued position can lower it and it is consistent
+    def isSettled(self, starts):
+        costs = [min(self.g.get(start, np.inf), self.rhs.get(start, np.inf)) for start in starts]
+        best = min(costs)
+        if (self.topKey() < best):
+            return False
+        return all(self.g.get(start, np.inf) == self.rhs.get(start, np.inf) for start, cost in zip(starts, costs)
+                   if cost == best)
+
+    # Settles positions until the cost of the cheapest of the starts is known. Budgets as in RoadNet.search; a search
+    ## stopped by them leaves the state valid and the next search continues from it. Returns the number of expanded
+    ## positions and if it finished
+    def computeShortestPath(self, starts, max_expansions=None, max_cost=None, deadline=None):
+        for u in self.changed:
+            self.updateVertex(u)
+        self.changed = set()
+
+        expanded = 0
+        while (not self.isSettled(starts)):
+            key = self.topKey()
+            if (key == np.inf): # Queue is empty, start cannot reach the goals
+                break
+            if ((max_expansions != None and expanded >= max_expansions) or (max_cost != None and key > max_cost) or
+                (deadline != None and time.perf_counter() > deadline)):
+                return expanded, False
+
+            key, u = heapq.heappop(self.queue)
+            del self.queued[u]
+            expanded += 1
+            if (self.g.get(u, np.inf) > self.rhs.get(u, np.inf)): # Cost went down, settling it
+                self.g[u] = self.rhs[u]
+            else: # Cost went up, recomputing it and everything that depended on it
+                self.g.pop(u, None)
+                self.updateVertex(u)
+            for p in self.getNeighbours(u):
+                self.updateVertex(p)
+        return expanded, True
+
+    # Path from start to the closest goal, following the cheapest step from every position
+    def getPath(self, start):
+        path = [start]
+        position = start
+        while (position not in self.goals):
+            costs = [(self.getCost(position, v, distance, steep) + self.g.get(v, np.inf), v)
+                     for v, distance, steep in self.steps[position]]
+            cost, position = min(costs, key=lambda c: c[0])
+            if (cost == np.inf):
+                return []
+            path.append(position)
+        return path
+
+    # Search from start to the goals, with the budgets of RoadNet.search (unset ones use the RoadNet defaults).
+    ## Partial paths are not available: a search out of budget returns an empty path
+    def search(self, start, max_expansions=None, max_cost=None, deadline=None):
+        return self.searchAny([start], max_expansions, max_cost, deadline)
+
+    # Search from the cheapest of the starts to the goals (e.g. from any patch of a parcel), as search
+    def searchAny(self, starts, max_expansions=None, max_cost=None, deadline=None):
+        road_graph = self.road_graph
+        max_expansions = max_expansions if max_expansions != None else road_graph.max_expansions
+        max_cost = max_cost if max_cost != None else road_graph.max_cost
+        if (deadline == None and road_graph.time_limit != None):
+            deadline = time.perf_counter() + road_graph.time_limit
+
+        expanded, finished = self.computeShortestPath(starts, max_expansions, max_cost, deadline)
+        if (not finished):
+            return road_graph.finishSearch(SearchResult(BUDGET_EXCEEDED, [], expanded))
+
+        start = min(starts, key=lambda start: self.g.get(start, np.inf))
+        cost = self.g.get(start, np.inf)
+        if (cost == np.inf):
+            return road_graph.finishSearch(SearchResult(UNREACHABLE, [], expanded))
+        if (max_cost != None and cost > max_cost):
+            return road_graph.finishSearch(SearchResult(BUDGET_EXCEEDED, [], expanded))
+        return road_graph.finishSearch(SearchResult(FOUND, self.getPath(start), expanded, cost))
@@ -0,0 +1,61 @@
+import numpy as np
+from scipy import ndimage
+
+# Possible expansion directions of a parcel, in order of preference
+DIRECTIONS = [(0, 1), (1, 0), (-1, 0), (0, -1)]
+
+# Number of set cells of mask inside every window of the given shape, indexed by the window's first cell
+def windowSums(mask, shape):
+    h, w = shape
+    integral = np.pad(np.cumsum(np.cumsum(mask, axis=0, dtype=np.int32), axis=1), ((1, 0), (1, 0)))
+    return integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w]
+
+# Shape (in patches) of a footprint expanding length patches in a direction and width patches perpendicular to it
+def footprintShape(direction, length, width):
+    return (length, width) if direction[0] != 0 else (width, length)
+
+# Patches (i, j) covered by a footprint starting at a seed. The seed is always the first one
+def footprintCells(seed, direction, length, width):
+    wide_direction = direction[::-1] # widening direction is perpendicular to the expand direction
+    return [(seed[0] + l*direction[0] + k*wide_direction[0], seed[1] + l*direction[1] + k*wide_direction[1])
+            for k in range(width) for l in range(length)]
+
+# Checks, for every patch of the grid, if a footprint expanding in a given direction fits in the free patches
+def footprintMask(free, direction, length, width):
+    h, w = footprintShape(direction, length, width)
+    feasible = np.zeros(free.shape, dtype=bool)
+    if (h > free.shape[0] or w > free.shape[1]):
+        return feasible
+
+    full = windowSums(free, (h, w)) == h*w
+    if (direction[0] + direction[1] > 0): # Footprint grows towards higher indices, so the seed is the window's first cell
+        feasible[:full.shape[0], :full.shape[1]] = full
+    else: # Seed is the window's last cell
+        feasible[h-1:, w-1:] = full
+    return feasible
+
+# Manhattan distance (in patches) of every patch to the closest road patch. Infinite if there are no roads
+def networkDistances(roads):
+    if (not roads.any()):
+        return np.full(roads.shape, np.inf)
+    return ndimage.distance_transform_cdt(~roads, metric='taxicab').astype(float)
+
+# Finds, for the whole grid, the direction each patch can expand to in order to make a parcel
+## Returns a grid with the index of the direction in DIRECTIONS, or -1 where no parcel fits
+def findFootprints(free, distances, length, width):
+    directions = np.full(free.shape, -1, dtype=np.int8)
+    unreached = np.isinf(distances)
+
+    for idx in range(len(DIRECTIONS)-1, -1, -1): # Reversed so the preferred directions are written last
+        direction = DIRECTIONS[idx]
+        feasible = footprintMask(free, direction, length, width)
+
+        # Next patch in the direction has to be further from the road network (if there is any)
+        next_distances = np.full(distances.shape, -np.inf)
+        src = tuple(slice(max(0, d), n + min(0, d)) for d, n in zip(direction, distances.shape))
+        dst = tuple(slice(max(0, -d), n + min(0, -d)) for d, n in zip(direction, distances.shape))
+        next_distances[dst] = distances[src]
+        away = (next_distances > distances) | unreached
+
+        directions[feasible & away] = idx
+    return directions
@@ -0,0 +1,86 @@
+import numpy as np
+from scipy import ndimage
+
+from .patch import PATCH_TYPES
+
+# Patch type a single surface block forces on its patch, or None (see Patch.getPatchType)
+def getBlockType(block):
+    if block=='minecraft:lava': 
+        return 'lava'
+    elif block=='minecraft:water':
+        return 'water'
+    elif block=='minecraft:cave_air':
+        return 'cave'
+    elif 'log' in block:
+        return 'tree'
+    return None
+
+# Splits a block grid into patches: result is indexed [i, j, k], k going over the blocks of patch (i, j) in row order
+def patchBlocks(blocks, patch_size):
+    width, height = blocks.shape[0] // patch_size, blocks.shape[1] // patch_size
+    blocks = blocks[:width*patch_size, :height*patch_size]
+    return blocks.reshape(width, patch_size, height, patch_size).transpose(0, 2, 1, 3).reshape(width, height, -1)
+
+# Type of every patch (as an index of PATCH_TYPES), given by the first block in it that is not land
+def classifyPatches(surface_blocks, patch_size):
+    names, codes = np.unique(surface_blocks.astype(str), return_inverse=True)
+    name_types = np.array([PATCH_TYPES.index(t) if t != None else -1 for t in map(getBlockType, names)], dtype=np.int8)
+    block_types = patchBlocks(name_types[codes.reshape(surface_blocks.shape)], patch_size)
+
+    special = block_types >= 0
+    first = np.argmax(special, axis=2)[..., None]
+    types = np.take_along_axis(block_types, first, axis=2)[..., 0]
+    return np.where(special.any(axis=2), types, PATCH_TYPES.index('land')).astype(np.int8)
+
+# Mean of values inside a square window around each cell, clipped to the grid
+def windowMeans(values, radius):
+    integral = np.pad(np.cumsum(np.cumsum(values, axis=0), axis=1), ((1, 0), (1, 0)))
+    lo_i, hi_i = [np.clip(np.arange(values.shape[0]) + d, 0, values.shape[0]) for d in (-radius, radius + 1)]
+    lo_j, hi_j = [np.clip(np.arange(values.shape[1]) + d, 0, values.shape[1]) for d in (-radius, radius + 1)]
+
+    sums = (integral[np.ix_(hi_i, hi_j)] - integral[np.ix_(lo_i, hi_j)]
+            - integral[np.ix_(hi_i, lo_j)] + integral[np.ix_(lo_i, lo_j)])
+    counts = np.outer(hi_i - lo_i, hi_j - lo_j)
+    return sums / counts
+
+# Elevation advantage (eh) and variance in elevation (ev, epv) of every patch (see Patch.get_eh and Patch.get_ev)
+def elevationLayers(elevation, view_radius, e_offset=10):
+    eh = np.exp((elevation - np.mean(elevation) - e_offset)**2 / -128)
+
+    centered = elevation - np.mean(elevation) # Reduces round-off in the variance
+    epv = np.maximum(windowMeans(centered**2, view_radius) - windowMeans(centered, view_radius)**2, 0)
+    ev = np.exp(-epv)
+    return eh, ev, epv
+
+# Euclidean distance (in blocks) from every patch to the closest water. Infinite if there is no water
+## resolution 'patch' measures between patch centers, 'block' from the closest block of each patch to the
+## closest water block (surface_water). Inside water patches only their water blocks count, unless they have none
+def waterDistances(water, surface_water, patch_size, resolution='patch'):
+    if (not water.any()):
+        return np.full(water.shape, np.inf)
+
+    if (resolution == 'patch'):
+        return ndimage.distance_transform_edt(~water, sampling=patch_size)
+
+    size = patch_size
+    width, height = water.shape
+    surface_water = surface_water[:width*size, :height*size]
+    has_water = patchBlocks(surface_water, size).any(axis=2)
+    water_blocks = np.kron(water, np.ones((size, size), dtype=bool))
+    water_blocks &= surface_water | np.kron(~has_water, np.ones((size, size), dtype=bool))
+
+    distance = ndimage.distance_transform_edt(~water_blocks)
+    return distance.reshape(width, size, height, size).min(axis=(1, 3))
+
+# Terrain stage: patch types and elevation statistics of every patch
+def terrainStage(heightmap, surface_blocks, patch_size):
+    heights = patchBlocks(heightmap, patch_size)
+    return {'types': classifyPatches(surface_blocks, patch_size),
+            'min_y': heights.min(axis=2), 'max_y': heights.max(axis=2), 'elevation': heights.mean(axis=2)}
+
+# Feature stage: terrain-derived layers used by the scores and the road network
+def featureStage(types, min_y, max_y, elevation, surface_water, patch_size, view_radius, e_offset, water_resolution):
+    water = types == PATCH_TYPES.index('water')
+    eh, ev, epv = elevationLayers(elevation, view_radius, e_offset)
+    return {'water_distance': waterDistances(water, surface_water, patch_size, water_resolution),
+            'steepness': max_y - min_y, 'eh': eh, 'ev': ev, 'epv': epv}
@@ -0,0 +1,87 @@
+import csv
+import os
+
+import numpy as np
+
+from .parcel import DEVELOPMENT_TYPES
+from .writer import BackgroundWriter
+
+# Statistics of the world's current state, as one row of a MetricsStream:
+## parcels of each development type, road patches, ratio of parcels connected to the roads, mean score of the parcels
+## of each agent (by its own score), totals of the road searches and of the road agent's work
+def worldStats(world, property_agents=[], road_agent=None):
+    stats = {'version': world.version, 'parcels': len(world.parcels)}
+
+    types = world.parcel_types[np.array(list(world.parcel_table), dtype=int)]
+    counts = np.bincount(types, minlength=len(DEVELOPMENT_TYPES))
+    for k, development_type in enumerate(DEVELOPMENT_TYPES):
+        stats[f"parcels_{development_type}"] = int(counts[k])
+
+    stats['road_patches'] = len(world.roads)
+    stats['connected_ratio'] = np.mean([parcel.connected for parcel in world.parcels]) if len(world.parcels) != 0 else np.nan
+
+    for agent in property_agents:
+        scores = [agent.getScore(world.patches[parcel.i, parcel.j])[agent.agent_type] for parcel in world.parcels
+                  if parcel.development_type == agent.agent_type]
+        stats[f"score_{agent.agent_type}"] = np.mean(scores) if len(scores) != 0 else np.nan
+
+    road_graph = world.road_graph
+    stats['searches'] = road_graph.searches
+    stats['searches_found'] = road_graph.found
+    stats['expanded'] = road_graph.expanded
+    stats['claim_conflicts'] = world.claim_conflicts
+    if (road_agent != None):
+        stats['parcels_connected'] = road_agent.connected
+        stats['parcels_destroyed'] = road_agent.destroyed
+    return stats
+
+# Writes rows of statistics (dicts of numbers, e.g. one worldStats per tick) to a CSV or .npz file (by path extension).
+## Writing runs in a background thread (see writer.BackgroundWriter): CSV rows are appended as they arrive, the .npz file
+## (one array per column) is rewritten every flush_every rows and on close. The columns are the keys of the first row
+## (missing values are NaN). If the writer falls behind and its queue is full, new rows are dropped (see dropped)
+class MetricsStream(BackgroundWriter):
+    def __init__(self, path, queue_size=256, flush_every=50):
+        self.path = path
+        self.flush_every = flush_every
+        self.npz = os.path.splitext(path)[1].lower() == '.npz'
+        self.columns = None
+        self.data = {} # Values of each column (.npz output)
+        self.rows = 0 # Number of rows written
+        self.file = self.writer = None # CSV output
+        BackgroundWriter.__init__(self, queue_size)
+
+    # Queues a row for writing. Returns False if the row had to be dropped
+    def record(self, row):
+        return self.put(dict(row))
+
+    def flush(self):
+        # Writing to a temporary file first, so the last complete flush is never lost
+        tmp_path = self.path[:-len(".npz")] + ".tmp.npz"
+        np.savez(tmp_path, **{column: np.array(values) for column, values in self.data.items()})
+        os.replace(tmp_path, self.path)
+
+    def writeItem(self, row):
+        if (self.columns == None):
+            self.columns = list(row)
+            self.data = {column: [] for column in self.columns}
+            if (not self.npz):
+                self.file = open(self.path, 'w', newline='')
+                self.writer = csv.writer(self.file)
+                self.writer.writerow(self.columns)
+
+        values = [row.get(column, np.nan) for column in self.columns]
+        if (self.npz):
+            for column, value in zip(self.columns, values):
+                self.data[column].append(value)
+            if ((self.rows + 1) % self.flush_every == 0):
+                self.flush()
+        else:
+            self.writer.writerow(values)
+            self.file.flush()
+        self.rows += 1
+
+    def finish(self):
+        if (self.file != None):
+            self.file.close()
+        if (self.npz and self.columns != None):
+            self.flush()
@@ -1,15 +1,46 @@
-from gdpc import geometry as GEO
-from gdpc import interface as INTF
-from gdpc import toolbox as TB
-from gdpc import worldLoader as WL
-
-import cv2
 import numpy as np
-from matplotlib import pyplot as plt
-from tqdm import tqdm
+
+DEVELOPMENT_TYPES = ['Vr', 'Vc', 'Vi', 'Vp'] # Residential, commercial, industrial and park
+
+# List of parcels with constant time removal (order is not kept: the last parcel takes the place of the removed one).
+## Every parcel knows its position (Parcel.index), so the changes that would move parcels around are not supported
+class ParcelList(list):
+    def append(self, parcel):
+        parcel.index = len(self)
+        super().append(parcel)
+
+    def extend(self, parcels):
+        for parcel in parcels:
+            self.append(parcel)
+
+    def remove(self, parcel):
+        if (parcel.index == None or parcel.index >= len(self) or self[parcel.index] is not parcel):
+            raise ValueError("ParcelList.remove(x): x not in list")
+        last = super().pop()
+        if last is not parcel:
+            super().__setitem__(parcel.index, last)
+            last.index = parcel.index
+        parcel.index = None
+
+    def pop(self, index=-1):
+        parcel = self[index]
+        self.remove(parcel)
+        return parcel
+
+    def clear(self):
+        for parcel in self:
+            parcel.index = None
+        super().clear()
+
+    def unsupported(self, *args, **kwargs):
+        raise TypeError("ParcelList only supports append, extend, remove, pop and clear")
+
+    insert = __setitem__ = __delitem__ = __iadd__ = __imul__ = sort = reverse = unsupported
 
 class Parcel:
     def __init__(self, *patches, expand_direction, development_type):
+        self.id = 0 # Set by the world when the parcel is created
+        self.index = None # Position in World.parcels
         self.patches = np.array(patches)
         self.development_type = development_type
         self.expand_direction = expand_direction # Used to define to what side the road must be attached to
@@ -1,34 +1,29 @@
-from gdpc import geometry as GEO
-from gdpc import interface as INTF
-from gdpc import toolbox as TB
-from gdpc import worldLoader as WL
-
-import cv2
 import numpy as np
-from matplotlib import pyplot as plt
-from tqdm import tqdm
 
 VIEW_RADIUS = 5
+PATCH_TYPES = ['land', 'water', 'lava', 'tree', 'cave', 'road'] # Possible values of Patch.type
+UNDEVELOPABLE_TYPES = ['water', 'tree', 'lava', 'cave', 'road'] # Patch types where nothing can be built
 
 # Euclidean distance between two patches
 def patchDistances(p1, p2):
     return np.sqrt((p1.x - p2.x)**2 + (p1.y - p2.y)**2 + (p1.z - p2.z)**2)
 
 class Patch:
-    def __init__(self, i, j, heights, size, xz_coordinates, WorldSlice):
+    def __init__(self, i, j, heights, size, xz_coordinates, WorldSlice, blocks=None, patch_type=None):
         self.size = size
         self.xz_coordinates = xz_coordinates
         self.region_heights = heights
         self.min_y = np.min(heights)
         self.max_y = np.max(heights)
         self.WorldSlice = WorldSlice
+        self.blocks = blocks # Surface blocks, if already read from the WorldSlice
         self.i = i
         self.j = j
 
-        self.type = self.getPatchType()
+        self.type = patch_type if patch_type != None else self.getPatchType()
 
         self.undeveloped = True
-        self.developable = False if self.type in ['water', 'tree', 'lava', 'cave', 'road'] else True
+        self.developable = False if self.type in UNDEVELOPABLE_TYPES else True
 
         # Patch coords (avg of blocks)
         self.y = self.getAvgHeight()
@@ -45,6 +40,10 @@ class Patch:
         self.eh = None # Elevation advantage
         self.ev = None # Variance in elevation (negative)
         self.epv = None # Variance in elevation (positive)
+        self.slope = None # Mean slope of the blocks (see terrain.terrainFeatureStage)
+        self.roughness = None # Mean local deviation of the heights
+        self.flatness = None # Fraction of flat blocks around
+        self.cliff = None # Fraction of blocks on a cliff
         self.dpr = None # Proximity to road
         self.dw = None # Proximity to water (score)
         self.dm = None # Proximity to market
@@ -87,13 +86,17 @@ class Patch:
         #self.dw = (1 + self.dwater)**-2
         return self.dw
 
-    # Proximity to market (score)
-    def get_dm(self, parcels):
+    # Distance to the closest commercial patch of the given parcels
+    def getMarketDistance(self, parcels):
         market_parcels = [p for p in parcels if p.development_type=='Vc']
         market_patches = []
         for parcel in market_parcels:
             market_patches += list(parcel.patches)
-        self.dcom  = min([patchDistances(self, market) for market in market_patches]+[np.inf])
+        return min([patchDistances(self, market) for market in market_patches]+[np.inf])
+
+    # Proximity to market (score)
+    def get_dm(self, parcels):
+        self.dcom = self.getMarketDistance(parcels)
 
         self.dm = np.exp(-self.dcom)
         #self.dm = (1 + self.dmarket)**-2
@@ -145,6 +148,9 @@ class Patch:
 
     # Return the block types in this patch
     def getPatchBlocks(self):
+        if (self.blocks is not None):
+            return self.blocks
+
         blocks = np.empty((self.size, self.size), dtype=object)
 
         for i in range(self.size):
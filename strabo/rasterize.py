@@ -0,0 +1,59 @@
+import numpy as np
+
+# Splits a path of patches into runs of consecutive neighbouring patches
+def splitRuns(path):
+    path = np.asarray(path, dtype=np.int64).reshape(-1, 2)
+    if (len(path) == 0):
+        return []
+    breaks = np.nonzero(np.abs(np.diff(path, axis=0)).sum(axis=1) != 1)[0] + 1
+    return np.split(path, breaks)
+
+# Block centreline of a run of patches: their centre blocks joined by straight lines, in path order
+def centreline(run, patch_size):
+    centres = run*patch_size + patch_size//2
+    steps = np.diff(centres, axis=0) // patch_size # Unit step of every segment
+    points = centres[:-1, None, :] + steps[:, None, :]*np.arange(patch_size)[None, :, None]
+    return np.concatenate([points.reshape(-1, 2), centres[-1:]])
+
+# Limits the change of a height profile to max_grade blocks per step, only lowering heights (the road cuts into bumps)
+## Result is the highest profile under the given one with that grade: min over k of heights[k] + max_grade*|i - k|
+def gradeProfile(heights, max_grade=1):
+    steps = max_grade*np.arange(len(heights))
+    forward = np.minimum.accumulate(heights - steps) + steps
+    backward = np.minimum.accumulate((heights + steps)[::-1])[::-1] - steps
+    return np.minimum(forward, backward)
+
+# Block cells and surface heights of roads of a given width along paths of patches.
+## Heights follow the heightmap smoothed over a square window of 2*smoothing + 1 blocks, graded along every path.
+## Corridor cells take the height of the closest centreline block. mask (block grid) limits the cells that can be
+## paved, e.g. to road patches. Returns the block indexes (i, j) of the cells and the height of the road block on them
+def rasterizeRoads(paths, heightmap, patch_size, width=3, smoothing=2, max_grade=1, mask=None):
+    empty = np.zeros(0, dtype=np.int64)
+    runs = [run for path in paths for run in splitRuns(path)]
+    if (len(runs) == 0):
+        return empty, empty, empty
+
+    import cv2 # Only loaded when roads are committed (see backends)
+    surface = (heightmap - 1).astype(np.float32) # Heightmap is the air block on top
+    smoothed = cv2.blur(surface, (2*smoothing + 1, 2*smoothing + 1), borderType=cv2.BORDER_REPLICATE)
+
+    lines, heights = [], []
+    for run in runs:
+        line = centreline(run, patch_size)
+        lines.append(line)
+        heights.append(gradeProfile(np.round(smoothed[line[:, 0], line[:, 1]]).astype(np.int64), max_grade))
+    lines, heights = np.concatenate(lines), np.concatenate(heights)
+
+    # Corridor: a square of cells around every centreline block, closest centreline block first
+    offsets = np.stack(np.meshgrid(np.arange(width) - width//2, np.arange(width) - width//2, indexing='ij'), axis=-1).reshape(-1, 2)
+    order = np.argsort(np.abs(offsets).max(axis=1), kind='stable')
+    cells = (lines[None, :, :] + offsets[order][:, None, :]).reshape(-1, 2)
+    cell_heights = np.tile(heights, len(offsets))
+
+    inside = ((cells >= 0) & (cells < surface.shape)).all(axis=1)
+    if (mask is not None):
+        inside[inside] = mask[cells[inside, 0], cells[inside, 1]]
+    cells, cell_heights = cells[inside], cell_heights[inside]
+
+    _, first = np.unique(cells[:, 0]*surface.shape[1] + cells[:, 1], return_index=True)
+    return cells[first, 0], cells[first, 1], cell_heights[first]
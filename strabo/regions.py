@@ -0,0 +1,133 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .world import World
+from .anvil import RegionSlice
+from .agents.property import PropertyDeveloper
+from .agents.road import RoadDeveloper
+from .simulation import NoRoadError, buildCity
+
+# Splits a range of n patches into k contiguous parts, returning their limits
+def splitRange(n, k):
+    return [round(n*part/k) for part in range(k+1)]
+
+# Simulates one region in its own World. Runs in a worker process, so it only returns plain data:
+## the road patches and paths, the road edges and the parcels (development type, expand direction, patches, connected),
+## all in patch coordinates of the region. Regions where no city can be started return an empty result
+def simulateRegion(bounds, STARTY, ENDY, patch_size, steps, explorers, save_path, seed):
+    np.random.seed(seed)
+    x0, z0, x1, z1 = bounds
+    worldslice = RegionSlice(save_path, x0, z0, x1 + 1, z1 + 1, processes=1) if save_path != None else None
+    world = World(x0, STARTY, z0, x1, ENDY, z1, patch_size=patch_size, worldslice=worldslice)
+
+    result = {'roads': [], 'road_paths': [], 'road_edges': [], 'parcels': []}
+    if (world.getFootprints().max() < 0): # Nothing can be built in this region
+        return result
+
+    property_agents = [PropertyDeveloper(world, agent_type) for agent_type in ["Vr", "Vc", "Vi"]]
+    road_agent = RoadDeveloper(world, explorers=explorers)
+    try:
+        buildCity(world, *property_agents, road_agent=road_agent, steps=steps)
+    except NoRoadError: # No first road (e.g. the first parcel is on an island)
+        return result
+
+    result['roads'] = [(patch.i, patch.j) for patch in world.roads]
+    result['road_paths'] = world.road_paths
+    result['road_edges'] = list(set(world.road_graph.roads))
+    result['parcels'] = [(parcel.development_type, parcel.expand_direction, [(p.i, p.j) for p in parcel.patches], parcel.connected)
+                         for parcel in world.parcels]
+    return result
+
+# Simulates a large area split in regions_x by regions_z regions, each in its own process, and merges them into
+## one World that can be committed as usual. Regions are aligned to patches, so no parcel crosses a border. During
+## reconciliation the road networks of neighbouring regions are connected, and parcels on a border are checked
+## again for road access (and removed if they have none, as RoadDeveloper does)
+def simulateRegions(STARTX, STARTY, STARTZ, ENDX, ENDY, ENDZ, regions=(2, 2), patch_size=5, steps=10, explorers=20,
+                    save_path=None, processes=None, seed=0):
+    # Patch grid of the whole area (same truncation as World)
+    width, height = (ENDX - STARTX + 2) // patch_size, (ENDZ - STARTZ + 2) // patch_size
+    limits_i, limits_j = splitRange(width, regions[0]), splitRange(height, regions[1])
+
+    tiles = {} # Patch offset of each region
+    tasks = []
+    for a in range(regions[0]):
+        for b in range(regions[1]):
+            tiles[(a, b)] = (limits_i[a], limits_j[b])
+            bounds = (STARTX + limits_i[a]*patch_size, STARTZ + limits_j[b]*patch_size,
+                      STARTX + limits_i[a+1]*patch_size - 1, STARTZ + limits_j[b+1]*patch_size - 1)
+            tasks.append((bounds, STARTY, ENDY, patch_size, steps, explorers, save_path, seed + len(tasks)))
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {tile: executor.submit(simulateRegion, *task) for tile, task in zip(tiles, tasks)}
+
+        # Loading the whole area while the regions are simulated
+        worldslice = RegionSlice(save_path, STARTX, STARTZ, ENDX + 1, ENDZ + 1) if save_path != None else None
+        world = World(STARTX, STARTY, STARTZ, ENDX, ENDY, ENDZ, patch_size=patch_size, worldslice=worldslice)
+        results = {tile: future.result() for tile, future in futures.items()}
+
+    mergeRegions(world, tiles, results)
+    reconcileRegions(world, tiles, results)
+    return world
+
+# Copies the roads and parcels of every region into the world
+def mergeRegions(world, tiles, results):
+    for tile, result in results.items():
+        di, dj = tiles[tile]
+        for path in result['road_paths']:
+            world.registerRoad([(i + di, j + dj) for i, j in path])
+        for edge in result['road_edges']:
+            world.road_graph.setRoad([(i + di, j + dj) for i, j in edge])
+
+    for tile, result in results.items():
+        di, dj = tiles[tile]
+        for development_type, expand_direction, positions, connected in result['parcels']:
+            parcel_patches = [world.patches[i + di, j + dj] for i, j in positions]
+            parcel = world.claimParcel(parcel_patches, expand_direction, development_type)
+            if (parcel == None):
+                continue
+            parcel.connected = connected
+            for patch in parcel.patches:
+                world.addBlockedPatch(patch)
+
+# Region each patch belongs to
+def getRegionLabels(world, tiles):
+    labels = np.zeros((world.width, world.height), dtype=int)
+    for label, (di, dj) in enumerate(sorted(tiles.values())):
+        labels[di:, dj:] = label
+    return labels
+
+# Connects the road networks across region borders and checks the parcels along them
+def reconcileRegions(world, tiles, results):
+    road_graph = world.road_graph
+
+    # Connecting the closest road patches of every pair of neighbouring regions
+    for (a, b), (di, dj) in tiles.items():
+        for neighbour in [(a + 1, b), (a, b + 1)]:
+            if (neighbour not in tiles):
+                continue
+            ni, nj = tiles[neighbour]
+            roads = np.array([(i + di, j + dj) for i, j in results[(a, b)]['roads']]).reshape(-1, 2)
+            neighbour_roads = np.array([(i + ni, j + nj) for i, j in results[neighbour]['roads']]).reshape(-1, 2)
+            if (len(roads) == 0 or len(neighbour_roads) == 0):
+                continue
+
+            distances = np.abs(roads[:, None, :] - neighbour_roads[None, :, :]).sum(axis=2)
+            k, l = np.unravel_index(np.argmin(distances), distances.shape)
+            start, end = tuple(roads[k].tolist()), tuple(neighbour_roads[l].tolist())
+            path = road_graph.findPath(start, end, max_expansions=world.width*world.height//4)
+            if (len(path) != 0):
+                road_graph.setRoad(path)
+                world.registerRoad(path)
+
+    # Parcels touching another region must be reached again by the merged road network
+    labels = getRegionLabels(world, tiles)
+    for parcel in world.parcels:
+        for patch in parcel.patches:
+            neighbours = [(patch.i + s[0], patch.j + s[1]) for s in [(1, 0), (0, 1), (-1, 0), (0, -1)]]
+            if any(0 <= i < world.width and 0 <= j < world.height and labels[i, j] != labels[patch.i, patch.j]
+                   for i, j in neighbours):
+                parcel.connected = False
+                break
+    RoadDeveloper(world, explorers=0).interact()
+    road_graph.clearEdges()
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+
+from .patch import PATCH_TYPES
+from .parcel import DEVELOPMENT_TYPES
+from .writer import BackgroundWriter
+
+# Colours (RGB) used to draw each patch type and parcel development type
+TYPE_COLORS = {
+    'water': (0, 0, 254),
+    'lava': (254, 0, 0),
+    'land': (0, 254, 100),
+    'tree': (0, 127, 0),
+    'cave': (100, 100, 100),
+    'road': (0, 0, 0),
+}
+OTHER_COLOR = (254, 254, 254) # Unknown patch types
+PARCEL_COLORS = {
+    'Vr': (0, 254, 254),
+    'Vc': (254, 254, 0),
+    'Vi': (254, 100, 100),
+}
+
+# Codes of the lookup table: patch types first, then unknown types, then parcel development types
+TYPE_CODES = {t: code for code, t in enumerate(PATCH_TYPES)}
+OTHER_CODE = len(PATCH_TYPES)
+PARCEL_CODES = {t: OTHER_CODE + 1 + code for code, t in enumerate(DEVELOPMENT_TYPES)}
+
+COLOR_LUT = np.array([TYPE_COLORS.get(t, OTHER_COLOR) for t in PATCH_TYPES] + [OTHER_COLOR] +
+                     [PARCEL_COLORS.get(t, OTHER_COLOR) for t in DEVELOPMENT_TYPES], dtype=np.uint8)
+
+# Grid of lookup table codes for every patch. Parcels with a colour are drawn on top of the patch types
+def getCodeGrid(world):
+    codes = np.array([[TYPE_CODES.get(patch.type, OTHER_CODE) for patch in row] for row in world.patches], dtype=np.uint8)
+
+    # Code of each parcel id, or 0 if its development type has no colour
+    parcel_codes = np.array([PARCEL_CODES[t] if t in PARCEL_COLORS else 0 for t in DEVELOPMENT_TYPES] + [0], dtype=np.uint8)
+    parcel_grid = parcel_codes[world.parcel_types[world.parcel_ids]] # Type -1 (no parcel) is the last entry
+    return np.where(parcel_grid != 0, parcel_grid, codes)
+
+# Image (RGB, one pixel per patch, x axis horizontal) of the world's current state
+def renderPatches(world, scale=1):
+    frame = COLOR_LUT[getCodeGrid(world)].transpose(1, 0, 2)
+    if (scale != 1):
+        frame = np.repeat(np.repeat(frame, scale, axis=0), scale, axis=1)
+    return np.ascontiguousarray(frame)
+
+# Writes frames to a PNG sequence (path is a directory) or a video file (path ends in .mp4 or .avi)
+## Encoding runs in a background thread (see writer.BackgroundWriter), so writing a frame does not stall the simulation.
+## If the writer falls behind and its queue is full, new frames are dropped (see dropped)
+class FrameWriter(BackgroundWriter):
+    def __init__(self, path, fps=10, queue_size=64):
+        self.path = path
+        self.fps = fps
+        self.video = os.path.splitext(path)[1].lower() in ['.mp4', '.avi']
+        self.writer = None
+        self.frames = 0 # Number of frames written
+
+        if (not self.video):
+            os.makedirs(path, exist_ok=True)
+        BackgroundWriter.__init__(self, queue_size)
+
+    # Queues a frame (RGB array) for writing. Returns False if the frame had to be dropped
+    def write(self, frame):
+        return self.put(frame)
+
+    def writeItem(self, frame):
+        import cv2 # Only loaded when frames are written (see backends)
+
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        if (self.video):
+            if (self.writer == None):
+                fourcc = cv2.VideoWriter_fourcc(*('mp4v' if self.path.lower().endswith('.mp4') else 'MJPG'))
+                self.writer = cv2.VideoWriter(self.path, fourcc, self.fps, (frame.shape[1], frame.shape[0]))
+            self.writer.write(frame)
+        elif (not cv2.imwrite(os.path.join(self.path, f"frame_{self.frames:06d}.png"), frame)):
+            raise OSError(f"Could not write frame {self.frames} to {self.path}")
+        self.frames += 1
+
+    def finish(self):
+        if (self.writer != None):
+            self.writer.release()
@@ -0,0 +1,131 @@
+import numpy as np
+from scipy import ndimage
+from scipy.sparse import csgraph
+
+CROSS = ndimage.generate_binary_structure(2, 1) # 4-neighbourhood, the moves of the road search
+
+# Articulation points (nodes whose removal disconnects their component) of an undirected CSR graph
+def articulationPoints(graph):
+    indptr, indices = graph.indptr, graph.indices
+    n = graph.shape[0]
+    discovery = np.full(n, -1)
+    low = np.zeros(n, dtype=int)
+    parent = np.full(n, -1)
+    is_articulation = np.zeros(n, dtype=bool)
+
+    time = 0
+    for root in range(n):
+        if (discovery[root] != -1):
+            continue
+        discovery[root] = low[root] = time
+        time += 1
+        root_children = 0
+
+        # Iterative DFS (Tarjan), the stack holds each node and the next edge to look at
+        stack = [(root, indptr[root])]
+        while (len(stack) != 0):
+            u, edge = stack[-1]
+            if (edge < indptr[u+1]):
+                stack[-1] = (u, edge + 1)
+                v = indices[edge]
+                if (discovery[v] == -1):
+                    parent[v] = u
+                    discovery[v] = low[v] = time
+                    time += 1
+                    if (u == root):
+                        root_children += 1
+                    stack.append((v, indptr[v]))
+                elif (v != parent[u]):
+                    low[u] = min(low[u], discovery[v])
+            else:
+                stack.pop()
+                if (len(stack) != 0):
+                    p = stack[-1][0]
+                    low[p] = min(low[p], low[u])
+                    if (p != root and low[u] >= discovery[p]):
+                        is_articulation[p] = True
+
+        if (root_children > 1):
+            is_articulation[root] = True
+    return np.nonzero(is_articulation)[0]
+
+# Connected components of the passable patches (labels, 0 where impassable) and the labels the road network can enter
+## A road search starts on a road patch and moves through passable patches, so a component is entered from the
+## network if it holds a road patch or touches one
+def roadComponents(passable, roads):
+    labels, _ = ndimage.label(passable, structure=CROSS)
+    entered = labels[ndimage.binary_dilation(roads, structure=CROSS) & passable]
+    return labels, np.unique(entered[entered != 0])
+
+# Checks if a road search can reach any of the goal patches (a mask) given the road components.
+## Goals are reached from a neighbour (they may be impassable themselves, as blocked parcel patches are)
+def isConnected(goals, roads, labels, entered):
+    around = ndimage.binary_dilation(goals, structure=CROSS)
+    if ((around & roads).any()): # Next to (or on) the network
+        return True
+    return np.isin(labels[around & (labels != 0)], entered).any()
+
+# Analytics of the road network computed with sparse graph routines, used to direct the road agent
+class RoadAnalytics:
+    def __init__(self, world):
+        self.world = world
+        road_graph = world.road_graph
+        self.shape = (world.width, world.height)
+
+        # Road network and its components
+        self.road_csr, self.road_positions = road_graph.getRoadGraph([(p.i, p.j) for p in world.roads])
+        self.road_set = set(self.road_positions)
+        self.n_components, self.components = csgraph.connected_components(self.road_csr, directed=False)
+        self.articulation_points = None # Weak points, only computed on request (see getArticulationPoints)
+
+        # Distance from the road network to every patch (through passable patches), and the closest road patch
+        self.passable = road_graph.getPassable()
+        self.grid_csr = road_graph.getGridGraph(self.passable)
+        road_nodes = [i*world.height + j for i, j in self.road_positions]
+        if (len(road_nodes) != 0):
+            distances, _, sources = csgraph.dijkstra(self.grid_csr, indices=road_nodes, min_only=True,
+                                                     return_predecessors=True)
+        else:
+            distances, sources = np.full(world.width*world.height, np.inf), np.full(world.width*world.height, -9999)
+        self.distances = distances.reshape(self.shape)
+        self.sources = sources.reshape(self.shape)
+
+    # Road patches whose removal would split the network. The road agent does not use them, so they are not computed
+    ## with the rest of the analytics every tick
+    def getArticulationPoints(self):
+        if (self.articulation_points == None):
+            self.articulation_points = [self.road_positions[k] for k in articulationPoints(self.road_csr)]
+        return self.articulation_points
+
+    # Size of the road component each road patch belongs to
+    def getComponentSize(self, position):
+        k = self.road_positions.index(position)
+        return np.count_nonzero(self.components == self.components[k])
+
+    # Best way to reach any of the goal patches from the road network
+    ## Returns (distance, road patch to start from, goal patch reached), or (inf, None, None) if it is unreachable.
+    ## Goals may be impassable themselves (e.g. blocked parcel patches), as in RoadNet.findPathAStar
+    def getApproach(self, goals):
+        best = (np.inf, None, None)
+        for goal in goals:
+            if (self.passable[goal] or goal in self.road_set):
+                candidates = [(self.distances[goal], goal)]
+            else: # Entering the goal from one of its neighbours
+                node = goal[0]*self.shape[1] + goal[1]
+                candidates = []
+                for step in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
+                    neighbour = (goal[0] + step[0], goal[1] + step[1])
+                    if (0 <= neighbour[0] < self.shape[0] and 0 <= neighbour[1] < self.shape[1]):
+                        weight = self.world.road_graph.getDistance(neighbour, goal)
+                        candidates.append((self.distances[neighbour] + weight, neighbour))
+
+            for distance, through in candidates:
+                if (distance < best[0]):
+                    source = self.sources[through]
+                    start = (int(source // self.shape[1]), int(source % self.shape[1]))
+                    best = (distance, start, goal)
+        return best
+
+    # Checks if any of the goal patches can be reached from the road network
+    def isReachable(self, goals):
+        return self.getApproach(goals)[0] < np.inf
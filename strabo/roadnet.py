@@ -1,35 +1,265 @@
+import time
+from collections import OrderedDict
+
 import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+# Possible outcomes of a path search
+FOUND = 'found'
+UNREACHABLE = 'unreachable' # Every reachable position was explored
+BUDGET_EXCEEDED = 'budget exceeded' # Search stopped before it could tell
+
+class SearchResult:
+    def __init__(self, status, path, expanded, cost=np.inf):
+        self.status = status
+        self.path = path # Path found, or the best partial path if one was requested (empty otherwise)
+        self.expanded = expanded # Number of nodes expanded
+        self.cost = cost
 
 class RoadNet:
-    def __init__(self, patches):
+    ## steep marks the patches too steep for a road (e.g. terrain.terrainFeatureStage), computed from the patches if not given.
+    ## terrain_cost is the extra cost of entering each patch (e.g. terrain.roadTerrainCost), none if not given
+    def __init__(self, patches, steep=None, terrain_cost=None):
         self.patches = patches
         self.X = [i for i in range(len(patches))]
         self.Y = [[patch.y for patch in patch_line] for patch_line in patches] # Average height of the patch
         self.Z = [j for j in range(len(patches[0]))]
 
-        self.blocked = []
+        if (steep is None):
+            steep = np.array([[abs(patch.max_y - patch.min_y) > patch.size - 1 for patch in row] for row in patches])
+        self.steep = np.asarray(steep, dtype=bool)
+        if (terrain_cost is None):
+            terrain_cost = np.zeros(self.steep.shape)
+        self.terrain_cost = np.asarray(terrain_cost, dtype=float)
+
+        self.blocked = set()
         self.edges = {}
         self.roads = []
 
+        # Incremental planners of the most recently used goals, told about every change of blocks and edges (see getPlanner)
+        self.planners = OrderedDict()
+        self.max_planners = 8
+        self.network_planner = None # Planner of the paths to the road network, kept for the whole run (see findConnection)
+        self.steps = None # Neighbours of every patch, shared by the planners (see getSteps)
+
+        # Default search budgets, used when a search does not set its own (None means unlimited)
+        self.max_expansions = None # Number of nodes expanded
+        self.max_cost = None # Cost of the path
+        self.time_limit = None # Seconds
+        self.last_search = None # Result of the last search
+
+        # Totals over all searches (see metrics.worldStats)
+        self.searches = 0
+        self.expanded = 0
+        self.found = 0
+
         # An easier way of getting the heighs for later 
         self.heights = {}
+        self.terrain_costs = {}
         for i in range(len(self.X)):
             for j in range(len(self.Z)):
                 self.heights[(self.X[i], self.Z[j])] = self.Y[i][j]
+                self.terrain_costs[(self.X[i], self.Z[j])] = float(self.terrain_cost[i, j])
 
     
+    # Distance of a step between neighbours without edge bonus: the step, the height difference and the terrain cost of
+    ## entering the next patch
+    def getDistance(self, position, next_position):
+        return 1 + abs(self.heights[position] - self.heights[next_position]) + self.terrain_costs[next_position]
+
     def addEdge(self, node1, node2):
         self.edges[(node1, node2)] = 0 # Default weight is 0
         self.edges[(node2, node1)] = 0
         # TO DO: add check nodes belong to the region
     
     def setBlocked(self, patch):
-        if patch not in self.blocked:
-            self.blocked.append(patch)
+        if (patch not in self.blocked):
+            self.blocked.add(patch)
+            for planner in self.getPlanners():
+                planner.cellChanged(patch)
 
     def setUnblocked(self, patch):
-        if patch in self.blocked:
-            self.blocked.remove(patch)
+        if (patch in self.blocked):
+            self.blocked.discard(patch)
+            for planner in self.getPlanners():
+                planner.cellChanged(patch)
+
+    # Tells the planners the bonus of an edge changed (both directions)
+    def notifyEdge(self, edge):
+        for planner in self.getPlanners():
+            planner.edgeChanged(*edge)
+            planner.edgeChanged(*edge[::-1])
+
+    # Neighbours of every patch, as (neighbour, distance without bonus, neighbour too steep). Computed once, the
+    ## heights and steep patches do not change
+    def getSteps(self):
+        if (self.steps == None):
+            steep = self.steep.tolist()
+            self.steps = {}
+            for position in self.heights:
+                self.steps[position] = []
+                for step in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
+                    neighbour = (position[0] + step[0], position[1] + step[1])
+                    if neighbour in self.heights:
+                        self.steps[position].append((neighbour, self.getDistance(position, neighbour),
+                                                     steep[neighbour[0]][neighbour[1]]))
+        return self.steps
+
+    # Incremental (D* Lite) planner for paths to dest or any of extra_goals, kept for the max_planners goals used last
+    def getPlanner(self, dest, extra_goals=[]):
+        from .dstar import DStarLite
+
+        key = frozenset([dest] + list(extra_goals))
+        if (key in self.planners):
+            self.planners.move_to_end(key)
+        else:
+            self.planners[key] = DStarLite(self, key)
+            if (len(self.planners) > self.max_planners):
+                self.planners.popitem(last=False)
+        return self.planners[key]
+
+    def getPlanners(self):
+        return list(self.planners.values()) + ([self.network_planner] if self.network_planner != None else [])
+
+    # Path from the cheapest of the starts (e.g. the patches of a parcel) to the road network (the road_positions),
+    ## returned from the network to the start. The planner of the network is kept between searches and ticks, and its
+    ## goals grow with the roads, so each search only repairs what changed since the last one. As with incremental
+    ## findPath, no edge is marked. Budgets as in search
+    def findConnection(self, starts, road_positions, **budget):
+        from .dstar import DStarLite
+
+        if (self.network_planner == None):
+            self.network_planner = DStarLite(self, road_positions)
+        else:
+            self.network_planner.setGoals(road_positions)
+        return self.network_planner.searchAny(starts, **budget).path[::-1]
+
+    # Patches that can be entered by a path (not blocked and not too steep)
+    def getPassable(self):
+        passable = ~self.steep
+        for position in self.blocked:
+            passable[position] = False
+        return passable
+
+    # Exports the patch grid as a sparse (CSR) directed graph. Node of patch (i, j) is i*height + j
+    ## Edges go from every patch to its passable neighbours, weighted by the distance used in the A* search
+    ## (without edge bonus). Impassable patches keep their outgoing edges, so searches can still start on them
+    def getGridGraph(self, passable=None):
+        if (passable is None):
+            passable = self.getPassable()
+        heights = np.array(self.Y, dtype=float)
+        width, height = heights.shape
+        nodes = np.arange(width*height).reshape(width, height)
+
+        rows, cols, weights = [], [], []
+        for di, dj in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
+            u = (slice(max(0, -di), width - max(0, di)), slice(max(0, -dj), height - max(0, dj)))
+            v = (slice(max(0, di), width - max(0, -di)), slice(max(0, dj), height - max(0, -dj)))
+            keep = passable[v]
+            rows.append(nodes[u][keep])
+            cols.append(nodes[v][keep])
+            weights.append((1 + np.abs(heights[u] - heights[v]) + self.terrain_cost[v])[keep])
+
+        rows, cols, weights = [np.concatenate(a) for a in (rows, cols, weights)]
+        return sparse.csr_matrix((weights, (rows, cols)), shape=(width*height, width*height))
+
+    # Grid graph (see getGridGraph) weighted by travel time with the current edge bonuses, as in the A* search
+    def getTrafficGraph(self, passable=None):
+        graph = self.getGridGraph(passable).tocoo()
+        height, n = len(self.Z), graph.shape[0]
+        weights = graph.data
+        if (len(self.edges) != 0):
+            # Matching the bonus of every edge to its entry in the graph through sorted keys
+            keys = np.array([(u[0]*height + u[1])*n + v[0]*height + v[1] for u, v in self.edges], dtype=np.int64)
+            bonuses = np.array(list(self.edges.values()), dtype=float)
+            order = np.argsort(keys)
+            keys, bonuses = keys[order], bonuses[order]
+            graph_keys = graph.row.astype(np.int64)*n + graph.col
+            k = np.minimum(np.searchsorted(keys, graph_keys), len(keys) - 1)
+            weights = weights/(1 + np.where(keys[k] == graph_keys, bonuses[k], 0))
+        return sparse.csr_matrix((weights, (graph.row, graph.col)), shape=graph.shape)
+
+    # Finds the paths between many (origin, destination) pairs at once, with one Dijkstra search per distinct origin.
+    ## Edge bonuses are applied after all paths are found: every edge gets bonus times the number of paths using it, and
+    ## edges no path used decay once (see setEdgeUse and setEdgeUnused). Returns the paths (empty if unreachable)
+    def assignTraffic(self, pairs, bonus=0.5):
+        passable = self.getPassable()
+        graph = self.getTrafficGraph(passable)
+        height = len(self.Z)
+        origins = sorted(set(origin for origin, destination in pairs))
+        if (len(origins) == 0):
+            return []
+        row = {origin: k for k, origin in enumerate(origins)}
+        distances, predecessors = csgraph.dijkstra(graph, indices=[i*height + j for i, j in origins],
+                                                   return_predecessors=True)
+
+        paths = []
+        for origin, destination in pairs:
+            distance, predecessor = distances[row[origin]], predecessors[row[origin]]
+            end, last = destination[0]*height + destination[1], []
+            if (not passable[destination] and destination != origin):
+                # Entering the destination from a neighbour, as the A* search does with goals
+                best = np.inf
+                for step in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
+                    neighbour = (destination[0] + step[0], destination[1] + step[1])
+                    if neighbour not in self.heights.keys():
+                        continue
+                    weight = self.getDistance(neighbour, destination)/(1 + self.edges.get((neighbour, destination), 0))
+                    if (distance[neighbour[0]*height + neighbour[1]] + weight < best):
+                        best = distance[neighbour[0]*height + neighbour[1]] + weight
+                        end = neighbour[0]*height + neighbour[1]
+                last = [destination]
+                if (best == np.inf):
+                    paths.append([])
+                    continue
+            elif (distance[end] == np.inf):
+                paths.append([])
+                continue
+
+            path = []
+            node = end
+            while (node >= 0):
+                path.append((int(node // height), int(node % height)))
+                node = predecessor[node]
+            path = path[::-1] + last
+            paths.append(path)
+
+        self.useEdges(paths, bonus)
+        return paths
+
+    # Marks the edges of many paths at once: every edge gets bonus times the number of paths using it, and edges no
+    ## path used decay once (see setEdgeUse and setEdgeUnused)
+    def useEdges(self, paths, bonus=0.5):
+        counts = {}
+        for path in paths:
+            for k in range(len(path)-1):
+                edge = (path[k], path[k+1])
+                edge = min(edge, edge[::-1])
+                counts[edge] = counts.get(edge, 0) + 1
+
+        for edge, count in counts.items():
+            self.setEdgeUse(edge, bonus*count)
+        for edge in self.edges.keys():
+            if not (edge in counts or edge[::-1] in counts):
+                self.setEdgeUnused(edge)
+
+    # Exports the road network as a sparse (CSR) graph between adjacent road patches, in both directions
+    ## Returns the graph and the (i, j) position of each of its nodes
+    def getRoadGraph(self, road_positions):
+        positions = sorted(set(road_positions))
+        index = {position: k for k, position in enumerate(positions)}
+
+        rows, cols, weights = [], [], []
+        for position, k in index.items():
+            for step in [(1, 0), (0, 1)]:
+                neighbour = (position[0] + step[0], position[1] + step[1])
+                if neighbour in index:
+                    rows += [k, index[neighbour]]
+                    cols += [index[neighbour], k]
+                    weights += [self.getDistance(position, neighbour), self.getDistance(neighbour, position)]
+        graph = sparse.csr_matrix((weights, (rows, cols)), shape=(len(positions), len(positions)))
+        return graph, positions
 
     def getBlocks(self):
         blocks = np.empty((self.size, self.size), dtype=object)
@@ -47,7 +277,27 @@ class RoadNet:
 
     # A* implementation using patches as nodes instead of blocks
     ## extra_goals refers to other positions that may consitute a final destination (e.g. patches of the goal parcel)
-    def findPathAStar(self, start, dest, extra_goals=[]):
+    ## Returns the path, or [] if it was not found (see search for budgets and the reason a search failed)
+    def findPathAStar(self, start, dest, extra_goals=[], **budget):
+        return self.search(start, dest, extra_goals=extra_goals, **budget).path
+
+    # A* search bounded by a maximum of expanded nodes, a path cost cutoff and a wall-clock deadline (from time.perf_counter).
+    ## Unset budgets use the RoadNet defaults. If partial is True and the budget runs out, the path to the explored node
+    ## closest to the destination is returned
+    def search(self, start, dest, extra_goals=[], max_expansions=None, max_cost=None, deadline=None, partial=False):
+        max_expansions = max_expansions if max_expansions != None else self.max_expansions
+        max_cost = max_cost if max_cost != None else self.max_cost
+        if (deadline == None and self.time_limit != None):
+            deadline = time.perf_counter() + self.time_limit
+
+        def getPath(node):
+            path = []
+            while node != None:
+                path.append(node.position)
+                node = node.parent
+            return path[::-1]
+
+
         def getChildren(node, visited, possible_nexts, dest): # Returns nodes accessible from current position
             current_position = node.position
             possible_steps = [(1, 0), (0, 1), (-1, 0), (0, -1)]
@@ -62,14 +312,12 @@ class RoadNet:
                 # 1. Check if next_position belongs to the map
                 if next_position not in self.heights.keys():
                     continue
-                next_patch = self.patches[next_position] # Retrieving next patch
-
                 # 2. Check if next_position not in blocked blocks
                 if next_position in self.blocked:
                     continue
 
                 # 3. Avoid too steep patches (moutains, caves...)
-                if abs(next_patch.max_y- next_patch.min_y) > next_patch.size - 1:
+                if self.steep[next_position]:
                     continue
 
                 # 4. Check if not visited
@@ -91,10 +339,18 @@ class RoadNet:
         end_node.g = end_node.h = end_node.f = 0
         goal_nodes = [dest] + extra_goals
 
-        visited_nodes = []
+        visited_nodes = set()
         open_list = [start_node]
+        expanded = 0
+        pruned = False # Some nodes were ignored for being over the cost cutoff
+        closest_node, closest_h = start_node, sum([abs(u - v) for u, v in zip([*start, self.heights[start]], [*dest, self.heights[dest]])])
 
         while(len(open_list) != 0):
+            # Stopping if out of budget
+            if ((max_expansions != None and expanded >= max_expansions) or
+                (deadline != None and time.perf_counter() > deadline)):
+                return self.finishSearch(SearchResult(BUDGET_EXCEEDED, getPath(closest_node) if partial else [], expanded))
+
             # Getting next node
             current_node = open_list[0]
             current_index =  0
@@ -105,16 +361,14 @@ class RoadNet:
 
             # Popping from list to be visited
             open_list.pop(current_index)
-            visited_nodes.append(current_node.position)
+            visited_nodes.add(current_node.position)
+            expanded += 1
+            if (current_node != start_node and current_node.h < closest_h): # Explored node closest to the destination
+                closest_node, closest_h = current_node, current_node.h
 
             # Reached destination! Retrieve path
             if current_node.position in goal_nodes:
-                path = []
-                node = current_node
-                while node != None:
-                    path.append(node.position)
-                    node = node.parent
-                return path[::-1]
+                return self.finishSearch(SearchResult(FOUND, getPath(current_node), expanded, current_node.g))
 
             # Retrieve children
             children = getChildren(current_node, visited_nodes, [node.position for node in open_list], goal_nodes)
@@ -126,7 +380,7 @@ class RoadNet:
                 dz = abs(current_node.position[1] - child.position[1])
                 dy = abs(self.heights[(current_node.position)] - self.heights[(child.position)]) # TO DO: Continua assim
 
-                dist = dx + dy + dz # Distance between current and children
+                dist = dx + dy + dz + self.terrain_costs[child.position] # Distance between current and children, harder on rough terrain
                 if ((current_node.position, child.position) in self.edges.keys()):
                     edge_speed_bonus = self.edges[(current_node.position, child.position)]
                 else:
@@ -144,25 +398,43 @@ class RoadNet:
                 # Final score
                 child.f = child.g + child.h
 
+                # Paths over the cost cutoff are not explored
+                if (max_cost != None and child.g > max_cost):
+                    pruned = True
+                    continue
+
                 for node in open_list:
                     if (child == node) and (child.g > node.g):
                         continue
                 
                 # Add child to open_list
                 open_list.append(child)
-        return [] # not reached
+
+        # Not reached. Unless the cutoff hid part of the map, no path exists
+        status = BUDGET_EXCEEDED if pruned else UNREACHABLE
+        return self.finishSearch(SearchResult(status, getPath(closest_node) if (partial and pruned) else [], expanded))
+
+    # Keeps the result of a search and adds it to the totals
+    def finishSearch(self, result):
+        self.last_search = result
+        self.searches += 1
+        self.expanded += result.expanded
+        self.found += int(result.status == FOUND)
+        return result
         
 
     # If an edge is used, the travel speed within it is increased
-    def setEdgeUse(self, edge):
+    def setEdgeUse(self, edge, bonus=0.5):
         if (edge in self.roads): # Roads do not receive any bonus
             return
 
         if (edge not in self.edges.keys()):
             self.addEdge(*edge)
         
-        self.edges[edge] += 0.5 # Increase travel speed by 0.5 m/s
-        self.edges[edge[::-1]] += 0.5 # Same for the other direction (undirected graph)
+        self.edges[edge] += bonus # Increase travel speed (by 0.5 m/s by default)
+        self.edges[edge[::-1]] += bonus # Same for the other direction (undirected graph)
+        if (bonus != 0):
+            self.notifyEdge(edge)
 
     # If an edge is unused, it deteriorates and bonus speed is reduced
     def setEdgeUnused(self, edge):
@@ -172,11 +444,15 @@ class RoadNet:
         if (edge not in self.edges.keys()):
             self.addEdge(*edge)
         
+        if (self.edges[edge] == 0 and self.edges[edge[::-1]] == 0): # Nothing left to lose
+            return
+
         self.edges[edge] -= 0.1 # Decrease travel speed by 0.1 m/s
         self.edges[edge[::-1]] -= 0.1 # Same for the other direction (undirected graph)
 
         self.edges[edge] = max(self.edges[edge], 0)
         self.edges[edge[::-1]] = max(self.edges[edge[::-1]], 0)
+        self.notifyEdge(edge)
 
     # Register the development of a new road
     def setRoad(self, path):
@@ -187,6 +463,7 @@ class RoadNet:
             
             self.edges[edge] = 6 # Increase travel speed to 5 m/s
             self.edges[edge[::-1]] = 6 # Same for the other direction (undirected graph)
+            self.notifyEdge(edge)
 
             self.roads.append(edge)
             self.roads.append(edge[::-1])
@@ -194,18 +471,32 @@ class RoadNet:
 
     # Clears edges bonus, keeping only those associated with roads
     def clearEdges(self):
+        old_edges = self.edges
         self.edges = {}
 
         for edge in self.roads:
             self.edges[edge] = 6
 
+        for edge, bonus in old_edges.items():
+            if (self.edges.get(edge, 0) != bonus):
+                self.notifyEdge(edge)
+
     # Finds the path between two blocks, marking the edges found by increasing their speed 
-    def findPath(self, start, dest, extra_goals=[]):
-        path = self.findPathAStar(start, dest, extra_goals=extra_goals)
+    ## budget can hold the search budgets of RoadNet.search; partial paths are returned but do not mark edges.
+    ## If incremental, the path is found by the planner of the goals (see getPlanner), repairing its last search, and
+    ## no edge is marked: the caller marks the paths of a whole tick at once (see useEdges), so the planners see no
+    ## change between the searches of a tick and repair the changes of a tick only once
+    def findPath(self, start, dest, extra_goals=[], incremental=False, **budget):
+        if (incremental):
+            budget.pop('partial', None) # Not available for incremental searches
+            return self.getPlanner(dest, extra_goals).search(start, **budget).path
+
+        result = self.search(start, dest, extra_goals=extra_goals, **budget)
+        path = result.path
 
         # Increases the travel speed in the edges of the path used
         used_edges = []
-        for i in range(len(path)-1):
+        for i in range(len(path)-1 if result.status == FOUND else 0):
             edge = (path[i], path[i+1])
             self.setEdgeUse(edge)
             used_edges.append(edge)
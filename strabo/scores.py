@@ -0,0 +1,96 @@
+import numpy as np
+
+from .parcel import DEVELOPMENT_TYPES
+
+# Raw (unweighted) score features of patches, shared by all property agents.
+## Every feature is computed at most once per world version: the cache is emptied whenever World.version changes
+class ScoreCache:
+    def __init__(self, world):
+        self.world = world
+        self.version = world.version
+        self.features = {}
+        self.grids = {} # Features of all patches at once, by view radius (see getFeatureGrids)
+
+        self.hits = 0
+        self.misses = 0
+
+    # Number of free patches and of distinct parcels of each development type around a patch
+    ## Uses the same window as PropertyDeveloper.getRegion, without excluding any development type
+    def getRegionCounts(self, i, j, view_radius):
+        return self.world.getRegionCounts((max(1,i-view_radius), i+view_radius), # Adding padding of 1 patch
+                                          (max(1, j-view_radius), j+view_radius))
+
+    # The proximity features depend on the world (or snapshot) scored, so they are stored through it (see
+    ## World.setPatchFeatures) instead of on the patch, which snapshots share with their world
+    def computeFeatures(self, patch, view_radius):
+        eh, ev, epv = patch.eh, patch.ev, patch.epv # Precomputed by the world's feature stage
+        dcom = patch.getMarketDistance(self.world.parcels)
+        dpr, dw, dm = np.exp(-patch.dp), np.exp(-patch.dwater), np.exp(-dcom)
+        self.world.setPatchFeatures(patch, {'dpr': dpr, 'dw': dw, 'dm': dm, 'dcom': dcom})
+        free, counts = self.getRegionCounts(patch.i, patch.j, view_radius)
+        return {'eh': eh, 'ev': ev, 'epv': epv, 'dpr': dpr, 'dw': dw, 'dm': dm, 'free': free, 'parcels': counts,
+                'slope': patch.slope, 'roughness': patch.roughness, 'flatness': patch.flatness, 'cliff': patch.cliff}
+
+    # Features of a patch for agents with the given view radius
+    def getFeatures(self, patch, view_radius):
+        if (self.version != self.world.version): # World changed, all features are outdated
+            self.features = {}
+            self.grids = {}
+            self.version = self.world.version
+
+        key = (patch.i, patch.j, view_radius)
+        features = self.features.get(key)
+        if (features == None):
+            self.misses += 1
+            features = self.computeFeatures(patch, view_radius)
+            self.features[key] = features
+        else:
+            self.hits += 1
+        return features
+
+    # Features of all patches of a World at once, as arrays over the patch grid (same values as getFeatures)
+    def getFeatureGrids(self, view_radius):
+        if (self.version != self.world.version):
+            self.features = {}
+            self.grids = {}
+            self.version = self.world.version
+        if (view_radius not in self.grids):
+            self.grids[view_radius] = self.computeFeatureGrids(view_radius)
+        return self.grids[view_radius]
+
+    def computeFeatureGrids(self, view_radius):
+        world = self.world
+        patches = world.patches
+        # Keeping the type of each attribute, so the values match the ones of getFeatures
+        grid = lambda attribute: np.array([[getattr(patch, attribute) for patch in row] for row in patches])
+
+        # Proximity to the closest commercial patch
+        x, y, z = grid('x'), grid('y'), grid('z')
+        market = [patch for parcel in world.parcels if parcel.development_type == 'Vc' for patch in parcel.patches]
+        dcom = np.full(x.shape, np.inf)
+        for patch in market:
+            dcom = np.minimum(dcom, np.sqrt((x - patch.x)**2 + (y - patch.y)**2 + (z - patch.z)**2))
+
+        # Free patches and distinct parcels of each type in the window of every patch
+        free = windowSums(world.developable & (world.parcel_ids == 0), view_radius)
+        counts = {t: np.zeros(x.shape, dtype=int) for t in DEVELOPMENT_TYPES}
+        owned = world.developable & (world.parcel_ids != 0)
+        for parcel_id in np.unique(world.parcel_ids[owned]):
+            seen = windowSums(owned & (world.parcel_ids == parcel_id), view_radius) > 0
+            counts[DEVELOPMENT_TYPES[world.parcel_types[parcel_id]]] += seen
+
+        return {'eh': grid('eh'), 'ev': grid('ev'), 'epv': grid('epv'), 'dpr': np.exp(-grid('dp')),
+                'dw': np.exp(-grid('dwater')), 'dm': np.exp(-dcom), 'free': free, 'parcels': counts,
+                'slope': grid('slope'), 'roughness': grid('roughness'), 'flatness': grid('flatness'), 'cliff': grid('cliff')}
+
+# Number of cells of mask inside the window of every patch, the one of ScoreCache.getRegionCounts:
+## rows max(1, i - radius) to i + radius (exclusive), same for columns
+def windowSums(mask, radius):
+    sums = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=int)
+    sums[1:, 1:] = np.cumsum(np.cumsum(mask, axis=0), axis=1)
+    i, j = np.arange(mask.shape[0]), np.arange(mask.shape[1])
+    i1, i2 = np.maximum(1, i - radius), np.minimum(mask.shape[0], i + radius)
+    j1, j2 = np.maximum(1, j - radius), np.minimum(mask.shape[1], j + radius)
+    i1, i2 = np.minimum(i1, i2), i2 # Empty windows near the edges
+    j1, j2 = np.minimum(j1, j2), j2
+    return (sums[i2][:, j2] - sums[i1][:, j2] - sums[i2][:, j1] + sums[i1][:, j1])
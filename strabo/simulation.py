@@ -0,0 +1,158 @@
+import time
+
+import numpy as np
+
+from .agents.scheduler import AgentScheduler
+from .metrics import worldStats
+
+# Raised when a city can not be started, no road can be built from its first parcel
+class NoRoadError(RuntimeError):
+    pass
+
+# Builds the first parcel and the first road of a city. Raises NoRoadError if no road can be built from the parcel.
+## retry_deadline (a time.perf_counter() time) bounds the searches retried without the RoadNet time limit
+def startCity(world, *property_agents, road_agent, road_attempts=100, retry_deadline=np.inf):
+    # Start by building a first property
+    while(len(world.parcels)==0):
+        property_agents[0].interact()
+    # Build the start of the road
+    for i in range(50):
+        road_agent.runExplore() 
+
+    start_point = (world.parcels[0].i, world.parcels[0].j)
+    path = []
+    # If every search ran out of time (timed runs), trying again without the time limit, up to retry_deadline
+    deadlines = [None] if world.road_graph.time_limit == None else [None, retry_deadline]
+    for deadline in deadlines:
+        for i in range(road_attempts): # Build at least one road
+            dest_patch = np.random.choice(world.patches.flatten())
+            end_point = (dest_patch.i, dest_patch.j)
+            path = world.road_graph.findPath(start_point, end_point, max_expansions=world.width*world.height//4, # Giving up quickly on bad destinations
+                                             deadline=deadline)
+            if (len(path)!=0):
+                break
+        if (len(path)!=0):
+            break
+    if (len(path)==0):
+        raise NoRoadError(f"No road could be built from the first parcel in {road_attempts} attempts")
+    world.registerRoad(path) 
+
+# Grows a city in the world: a first parcel and road, then steps of property and road development
+## metrics (a metrics.MetricsStream) receives the statistics of the world after every step
+def buildCity(world, *property_agents, road_agent, steps, plot=False, road_attempts=100, metrics=None): 
+    startCity(world, *property_agents, road_agent=road_agent, road_attempts=road_attempts)
+    if plot:
+        world.plotPatches()
+    scheduler = AgentScheduler(world, *property_agents)
+    for i in range(steps):
+        scheduler.step() # Property agents prospect, then claim their parcels
+        #world.plotPatches()
+
+        road_agent.interact()
+        #world.plotPatches()
+
+        if (metrics != None):
+            metrics.record({'tick': i, **worldStats(world, property_agents, road_agent)})
+
+# Wall-clock budget of a run, with a slot reserved at the end (e.g. for committing to the world)
+## Keeps a moving average of the cost of each phase, per unit of work (a tick, an explorer...)
+class TimeBudget:
+    def __init__(self, total, reserve=0, smoothing=0.5):
+        self.start = time.perf_counter()
+        self.total = total
+        self.reserve = reserve
+        self.smoothing = smoothing
+        self.costs = {} # Seconds per unit of work of each phase
+
+    # Time left before the reserved slot
+    def remaining(self):
+        return self.start + self.total - self.reserve - time.perf_counter()
+
+    # Time left including the reserved slot
+    def remainingTotal(self):
+        return self.start + self.total - time.perf_counter()
+
+    # Expected duration of some units of work of a phase (0 if it was never measured)
+    def estimate(self, phase, units=1):
+        return self.costs.get(phase, 0)*units
+
+    # Times a phase that does some units of work. Use as: with budget.measure('phase', units): ...
+    def measure(self, phase, units=1):
+        return PhaseTimer(self, phase, units)
+
+    def update(self, phase, elapsed, units):
+        if (units <= 0):
+            return
+        cost = elapsed/units
+        if phase in self.costs:
+            cost = self.smoothing*cost + (1 - self.smoothing)*self.costs[phase]
+        self.costs[phase] = cost
+
+class PhaseTimer:
+    def __init__(self, budget, phase, units):
+        self.budget = budget
+        self.phase = phase
+        self.units = units
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.budget.update(self.phase, time.perf_counter() - self.start, self.units)
+
+# Grows a city like buildCity, but finishing within a time budget (seconds), keeping commit_reserve seconds free.
+## The cost of each phase is measured live and, every tick, the number of explorers, the rounds of property
+## development and the time limit of each road search are set so the remaining ticks fit in the remaining time.
+## Stops early if not even a minimal tick fits. Returns the TimeBudget, so the caller can check the time left
+def buildCityTimed(world, *property_agents, road_agent, budget, steps, commit_reserve=5, min_explorers=0,
+                   max_explorers=None, max_rounds=3, road_attempts=100, metrics=None):
+    timer = TimeBudget(budget, commit_reserve)
+    road_graph = world.road_graph
+    max_explorers = max_explorers if max_explorers != None else road_agent.explorers
+    default_explorers, default_time_limit = road_agent.explorers, road_graph.time_limit
+
+    road_graph.time_limit = max(timer.remaining(), 0)/(2*road_attempts) # The start can not take the whole budget
+    startCity(world, *property_agents, road_agent=road_agent, road_attempts=road_attempts,
+              retry_deadline=time.perf_counter() + max(timer.remaining(), 0))
+
+    scheduler = AgentScheduler(world, *property_agents)
+    for tick in range(steps):
+        remaining = timer.remaining()
+        target = remaining/(steps - tick) # Time for this tick
+        minimal = timer.estimate('property') + timer.estimate('connect')
+        if (remaining <= 0 or remaining < minimal):
+            break
+
+        # Exploration gets the time left by the mandatory phases. If never measured, start with a few explorers
+        if ('explore' in timer.costs):
+            explorers = int(np.clip((target - minimal)/max(timer.estimate('explore'), 1e-6), min_explorers, max_explorers))
+        else:
+            explorers = max(min_explorers, min(max_explorers, 10))
+
+        # Extra rounds of property development only when exploration is already at its maximum
+        rounds = 1
+        if (explorers == max_explorers and 'property' in timer.costs):
+            spare = target - timer.estimate('explore', explorers) - timer.estimate('connect')
+            rounds = int(np.clip(spare/max(timer.estimate('property'), 1e-6), 1, max_rounds))
+
+        # A single road search can not take more than part of the tick
+        road_graph.time_limit = max(target/4, 1e-3)
+
+        with timer.measure('property', rounds):
+            for i in range(rounds):
+                scheduler.step() # Property agents prospect, then claim their parcels
+
+        road_agent.explorers = explorers
+        with timer.measure('explore', explorers):
+            road_agent.explore()
+
+        with timer.measure('connect'):
+            road_agent.connect()
+
+        if (metrics != None): # Outside the measured phases, but taken from the time left like them
+            metrics.record({'tick': tick, 'explorers': explorers, 'rounds': rounds, 'time_left': timer.remaining(),
+                            **worldStats(world, property_agents, road_agent)})
+
+    road_agent.explorers, road_graph.time_limit = default_explorers, default_time_limit
+    return timer
@@ -0,0 +1,210 @@
+import numpy as np
+
+from .parcel import Parcel, DEVELOPMENT_TYPES
+from .roadgraph import isConnected, roadComponents
+from .scores import ScoreCache
+
+# Copy-on-write view of a World for what-if evaluation. Changes (parcels, blocked patches, roads and road edges) are kept
+## in overlay dicts over the world's arrays, so forking costs the same on any map size, and reads fall through the
+## overlays of the parent snapshots down to the world. A snapshot can be scored like the world (it has its own
+## ScoreCache), then discarded, or merged into its parent by replaying its changes there.
+## The world should not change while a snapshot of it is in use. Patch attributes updated by the world itself
+## (e.g. the distance to the roads, Patch.dp) are not overlaid and keep the world's values. Patches are shared with the
+## world and never written: score features computed in a snapshot go to its patch_features overlay
+class WorldSnapshot:
+    def __init__(self, base):
+        self.base = base # World or parent snapshot
+        self.world = base.world if isinstance(base, WorldSnapshot) else base
+        self.version = base.version # Increased on every change, as World.version
+        self.next_parcel_id = base.next_parcel_id if isinstance(base, WorldSnapshot) else -1 # Provisional ids are negative
+
+        # Overlays
+        self.parcel_ids = {} # Parcel id of each changed patch position
+        self.parcel_types = {} # Development type (index of DEVELOPMENT_TYPES) of each new parcel
+        self.blocked = {} # True if a position was blocked, False if unblocked
+        self.roads = {} # Positions turned into roads
+        self.edges = {} # Road network edge bonuses
+        self.patch_features = {} # Score features (dpr, dw, dm, dcom) of each scored patch position
+        self.new_parcels = []
+        self.log = [] # Changes, in order, replayed by merge
+
+        self.score_cache = ScoreCache(self)
+
+    # Child snapshot of this one
+    def fork(self):
+        return WorldSnapshot(self)
+
+    # Value of key in an overlay of this snapshot or of its parents, or read(key) from the world
+    def lookup(self, overlay, key, read):
+        snapshot = self
+        while isinstance(snapshot, WorldSnapshot):
+            values = getattr(snapshot, overlay)
+            if key in values:
+                return values[key]
+            snapshot = snapshot.base
+        return read(key)
+
+    # All the entries of an overlay, from the world's side up to this snapshot (later ones replace earlier ones)
+    def getOverlay(self, overlay):
+        chain = []
+        snapshot = self
+        while isinstance(snapshot, WorldSnapshot):
+            chain.append(getattr(snapshot, overlay))
+            snapshot = snapshot.base
+        merged = {}
+        for values in chain[::-1]:
+            merged.update(values)
+        return merged
+
+    def getParcelId(self, position):
+        return self.lookup('parcel_ids', position, lambda key: int(self.world.parcel_ids[key]))
+
+    def getParcelType(self, parcel_id):
+        return self.lookup('parcel_types', parcel_id, lambda key: int(self.world.parcel_types[key]))
+
+    def isBlocked(self, position):
+        return self.lookup('blocked', position, lambda key: key in self.world.road_graph.blocked)
+
+    def isRoad(self, position):
+        return self.lookup('roads', position, lambda key: self.world.patches[key].type == 'road')
+
+    def getEdge(self, edge):
+        return self.lookup('edges', edge, lambda key: self.world.road_graph.edges.get(key, 0))
+
+    # Score feature of a patch, as last computed in this snapshot, its parents or the world
+    def getPatchFeature(self, position, name):
+        return self.lookup('patch_features', position, lambda key: {}).get(name, getattr(self.world.patches[position], name))
+
+    def isDevelopable(self, position):
+        return bool(self.world.developable[position]) and not self.isRoad(position)
+
+    # Parcels of the world and the ones created in this snapshot and its parents
+    @property
+    def parcels(self):
+        new_parcels = []
+        snapshot = self
+        while isinstance(snapshot, WorldSnapshot):
+            new_parcels = snapshot.new_parcels + new_parcels
+            snapshot = snapshot.base
+        return list(self.world.parcels) + new_parcels
+
+    # Same as World.getRegionCounts, with the overlays applied to the window
+    def getRegionCounts(self, i_range, j_range):
+        window = (slice(*i_range), slice(*j_range))
+        ids = self.world.parcel_ids[window].copy()
+        developable = self.world.developable[window].copy()
+        i0, j0 = window[0].indices(self.world.width)[0], window[1].indices(self.world.height)[0]
+
+        for (i, j), parcel_id in self.getOverlay('parcel_ids').items():
+            if (0 <= i - i0 < ids.shape[0] and 0 <= j - j0 < ids.shape[1]):
+                ids[i - i0, j - j0] = parcel_id
+        for (i, j), road in self.getOverlay('roads').items():
+            if (road and 0 <= i - i0 < ids.shape[0] and 0 <= j - j0 < ids.shape[1]):
+                developable[i - i0, j - j0] = False
+
+        parcel_ids = np.unique(ids[developable & (ids != 0)])
+        types = [self.getParcelType(int(parcel_id)) for parcel_id in parcel_ids]
+        counts = np.bincount(np.array(types, dtype=int), minlength=len(DEVELOPMENT_TYPES))
+        return int(np.count_nonzero(developable & (ids == 0))), {t: int(n) for t, n in zip(DEVELOPMENT_TYPES, counts)}
+
+    # Road patches and passable patches of the whole map with the overlays applied
+    def getRoadMasks(self):
+        roads = np.array([[patch.type == "road" for patch in row] for row in self.world.patches])
+        passable = self.world.road_graph.getPassable()
+        for position, road in self.getOverlay('roads').items():
+            roads[position] = road
+        for position, blocked in self.getOverlay('blocked').items():
+            passable[position] = not blocked and not self.world.road_graph.steep[position]
+        return roads, passable
+
+    # Same as World.isReachableBlocking, for the new parcel only
+    def isReachableBlocking(self, parcel_patches):
+        roads, passable = self.getRoadMasks()
+        if (not roads.any()):
+            return True
+        goals = np.zeros(passable.shape, dtype=bool)
+        goals[([p.i for p in parcel_patches], [p.j for p in parcel_patches])] = True
+        return isConnected(goals, roads, *roadComponents(passable & ~goals, roads))
+
+    # Speculative versions of the World and RoadNet changes. They return as the originals
+
+    # Not logged: the world computes its own features when it is scored after a merge
+    def setPatchFeatures(self, patch, features):
+        self.patch_features[(patch.i, patch.j)] = dict(features)
+
+    def claimParcel(self, parcel_patches, expand_direction, development_type, transactional=False):
+        positions = [(patch.i, patch.j) for patch in parcel_patches]
+        if (any(self.getParcelId(position) != 0 for position in positions)):
+            return
+        if (transactional and not self.isReachableBlocking(parcel_patches)):
+            return
+
+        # The patches are not changed, the parcel only exists in the overlays
+        new_parcel = Parcel(*parcel_patches, expand_direction=expand_direction, development_type=development_type)
+        new_parcel.id = self.next_parcel_id
+        self.next_parcel_id -= 1
+        self.parcel_types[new_parcel.id] = DEVELOPMENT_TYPES.index(development_type)
+        for position in positions:
+            self.parcel_ids[position] = new_parcel.id
+            if (transactional):
+                self.blocked[position] = True
+        self.new_parcels.append(new_parcel)
+        self.log.append(('claimParcel', (parcel_patches, expand_direction, development_type, transactional)))
+        self.version += 1
+        return new_parcel
+
+    def setBlocked(self, position):
+        self.blocked[position] = True
+        self.log.append(('setBlocked', (position,)))
+        self.version += 1
+
+    def setUnblocked(self, position):
+        self.blocked[position] = False
+        self.log.append(('setUnblocked', (position,)))
+        self.version += 1
+
+    def registerRoad(self, path):
+        for position in path:
+            self.roads[position] = True
+        self.log.append(('registerRoad', (list(path),)))
+        self.version += 1
+
+    def setRoad(self, path):
+        for k in range(len(path)-1):
+            self.edges[(path[k], path[k+1])] = 6
+            self.edges[(path[k+1], path[k])] = 6
+        self.log.append(('setRoad', (list(path),)))
+        self.version += 1
+
+    # Drops all the changes of this snapshot
+    def discard(self):
+        self.parcel_ids, self.parcel_types, self.blocked, self.roads, self.edges = {}, {}, {}, {}, {}
+        self.patch_features = {}
+        self.new_parcels = []
+        self.log = []
+        self.version += 1
+
+    # Replays the changes of this snapshot on its parent, then empties it. Returns the number of changes that failed
+    ## (parcels that can no longer be claimed there)
+    def merge(self):
+        failed = 0
+        if (isinstance(self.base, WorldSnapshot)):
+            for change, args in self.log:
+                if (getattr(self.base, change)(*args) == None and change == 'claimParcel'):
+                    failed += 1
+        else:
+            world = self.base
+            for change, args in self.log:
+                if (change == 'claimParcel'):
+                    failed += int(world.claimParcel(*args[:3], transactional=args[3]) == None)
+                elif (change == 'setBlocked'):
+                    world.road_graph.setBlocked(*args)
+                elif (change == 'setUnblocked'):
+                    world.road_graph.setUnblocked(*args)
+                elif (change == 'registerRoad'):
+                    world.registerRoad(*args)
+                elif (change == 'setRoad'):
+                    world.road_graph.setRoad(*args)
+            world.version += 1
+        self.discard()
+        return failed
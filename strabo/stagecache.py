@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+import zipfile
+
+import numpy as np
+
+# On-disk cache of the array outputs of deterministic preprocessing stages.
+## Entries are content addressed: the key is a hash of the stage's input arrays and parameters, so changing
+## the terrain, the patch size or a stage parameter creates a new entry instead of reusing a wrong one
+class StageCache:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+    # Hash of a stage's inputs (arrays, possibly of block names) and parameters
+    def getKey(self, stage, inputs, params):
+        digest = hashlib.sha256(stage.encode())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        for name in sorted(inputs):
+            array = np.asarray(inputs[name])
+            if (array.dtype == object): # Block names: hashing the distinct names and the grid of their indices
+                names, codes = np.unique(array.astype(str), return_inverse=True)
+                digest.update('\n'.join(names).encode())
+                array = codes.reshape(array.shape).astype(np.int64)
+            digest.update(name.encode())
+            digest.update(str((array.dtype.str, array.shape)).encode())
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def getFile(self, stage, key):
+        return os.path.join(self.path, f"{stage}-{key}.npz")
+
+    # Stored outputs of a stage, or None if they were never computed
+    def load(self, stage, key):
+        try:
+            with np.load(self.getFile(stage, key)) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError, zipfile.BadZipFile): # Missing or incomplete entry
+            return None
+
+    def save(self, stage, key, outputs):
+        # Writing to a temporary file first, so an interrupted run never leaves a broken entry behind
+        file = self.getFile(stage, key)
+        tmp_file = file[:-len(".npz")] + ".tmp.npz"
+        np.savez(tmp_file, **outputs)
+        os.replace(tmp_file, file)
+
+    # Returns the outputs of a stage (a dict of arrays), computing them with compute(**inputs, **params) if not cached
+    def run(self, stage, compute, inputs, params):
+        key = self.getKey(stage, inputs, params)
+        outputs = self.load(stage, key)
+        if (outputs == None):
+            self.misses += 1
+            outputs = compute(**inputs, **params)
+            self.save(stage, key, outputs)
+        else:
+            self.hits += 1
+        return outputs
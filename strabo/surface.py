@@ -0,0 +1,68 @@
+import time
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+
+from .anvil import decodeColumns, getColumnBlock, pasteChunk
+
+CHUNKS_PER_REQUEST = 8 # Chunks along each side of a batch fetched from the server
+
+# Terrain of the running world with only the heightmap and the top depth blocks of every column, used instead of a WorldSlice.
+## Chunks are fetched in batches and decoded into compact arrays; the NBT data of a batch is released before the next
+## one is fetched. Coordinates follow WorldSlice (x2 and z2 are exclusive, heightmaps have one extra row and column)
+class SurfaceSlice:
+    def __init__(self, x1, z1, x2, z2, heightmap_type='MOTION_BLOCKING_NO_LEAVES', depth=1, batch=CHUNKS_PER_REQUEST):
+        from gdpc import direct_interface as DI # Connects to the server, only loaded when a slice is read (see backends)
+        from nbt import nbt
+
+        self.rect = x1, z1, x2 - x1, z2 - z1
+        self.heightmap_type = heightmap_type
+        self.depth = depth
+
+        width, length = self.rect[2] + 1, self.rect[3] + 1
+        heightmap = np.zeros((width, length), dtype=np.int64)
+        self.column_blocks = np.full((width, length, depth), 'minecraft:void_air', dtype=object)
+
+        cx1, cz1 = x1 >> 4, z1 >> 4
+        cx2, cz2 = ((x1 + self.rect[2] - 1) >> 4) + 1, ((z1 + self.rect[3] - 1) >> 4) + 1
+        for bx in range(cx1, cx2, batch):
+            for bz in range(cz1, cz2, batch):
+                dx, dz = min(batch, cx2 - bx), min(batch, cz2 - bz)
+                chunks = nbt.NBTFile(buffer=BytesIO(DI.getChunks(bx, bz, dx, dz, rtype='bytes')))['Chunks']
+                for k, chunk in enumerate(chunks): # Ordered x + z*dx, as in WorldSlice
+                    chunk_heightmap, chunk_columns = decodeColumns(chunk, heightmap_type, depth)
+                    pasteChunk(bx + k % dx, bz + k // dx, x1, z1, (chunk_heightmap, chunk_columns),
+                               (heightmap, self.column_blocks))
+                del chunks
+
+        self.heightmaps = {heightmap_type: heightmap}
+        self.surface_blocks = self.column_blocks[..., 0]
+
+    def __repr__(self):
+        x1, z1 = self.rect[:2]
+        x2, z2 = self.rect[0] + self.rect[2], self.rect[1] + self.rect[3]
+        return f"SurfaceSlice{(x1, z1, x2, z2)}"
+
+    # Returns the block's namespaced id. Only the top depth blocks of each column are loaded, others read as void air
+    def getBlockAt(self, x, y, z):
+        return getColumnBlock(self, x, y, z)
+
+# Time (seconds) and peak traced memory (bytes) of loading a terrain source with load()
+def measureSource(load):
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        source = load()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del source
+    return elapsed, peak
+
+# Compares loading an area as a full WorldSlice and as a SurfaceSlice. Returns {source name: (seconds, peak bytes)}
+def compareSources(x1, z1, x2, z2, depth=1):
+    from gdpc import worldLoader as WL
+    return {'WorldSlice': measureSource(lambda: WL.WorldSlice(x1, z1, x2, z2)),
+            'SurfaceSlice': measureSource(lambda: SurfaceSlice(x1, z1, x2, z2, depth=depth))}
@@ -0,0 +1,57 @@
+import numpy as np
+
+from .layers import patchBlocks
+
+# OpenCV is imported by each function, so the terrain features only load it when they are computed (see backends)
+
+# Slope (height rise per block) of every block, from the Sobel derivatives of the heightmap
+def slopeLayer(heightmap):
+    import cv2
+    heights = heightmap.astype(np.float32)
+    dx = cv2.Sobel(heights, cv2.CV_32F, 1, 0, ksize=3, borderType=cv2.BORDER_REPLICATE) / 8
+    dz = cv2.Sobel(heights, cv2.CV_32F, 0, 1, ksize=3, borderType=cv2.BORDER_REPLICATE) / 8
+    return cv2.magnitude(dx, dz)
+
+# Standard deviation of the heights inside a square window around every block
+def roughnessLayer(heightmap, radius):
+    import cv2
+    heights = heightmap.astype(np.float32)
+    heights -= heights.mean() # Reduces round-off in the variance
+    size = (2*radius + 1, 2*radius + 1)
+    mean = cv2.boxFilter(heights, -1, size, borderType=cv2.BORDER_REFLECT)
+    mean_sq = cv2.boxFilter(heights*heights, -1, size, borderType=cv2.BORDER_REFLECT)
+    return np.sqrt(np.maximum(mean_sq - mean*mean, 0))
+
+# Fraction of flat blocks (slope up to max_slope) inside a square window around every block
+def flatnessLayer(slope, radius, max_slope=0.5):
+    import cv2
+    flat = (slope <= max_slope).astype(np.float32)
+    return cv2.boxFilter(flat, -1, (2*radius + 1, 2*radius + 1), borderType=cv2.BORDER_REFLECT)
+
+# Blocks with a drop of at least cliff_height to one of their 4 neighbours (too high to walk or build a road over)
+def cliffMask(heightmap, cliff_height=2):
+    import cv2
+    heights = heightmap.astype(np.float32)
+    cross = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+    highest = cv2.dilate(heights, cross, borderType=cv2.BORDER_REPLICATE)
+    lowest = cv2.erode(heights, cross, borderType=cv2.BORDER_REPLICATE)
+    return np.maximum(highest - heights, heights - lowest) >= cliff_height
+
+# Extra cost of a road entering each patch, for its slope and its cliffs (both from terrainFeatureStage, see RoadNet)
+def roadTerrainCost(slope, cliff, slope_weight=2, cliff_weight=4):
+    return slope_weight*slope + cliff_weight*cliff
+
+# Terrain feature stage: block resolution features of the heightmap, aggregated to the patch grid
+##  slope / max_slope: mean and maximum slope of the blocks of the patch
+##  roughness: mean local deviation of the heights, flatness: mean fraction of flat blocks around the blocks of the patch
+##  cliff: fraction of the blocks of the patch on a cliff
+##  steep: patches too steep for a road (height range over patch_size - 1 blocks, see RoadNet)
+def terrainFeatureStage(heightmap, patch_size, radius=2, max_slope=0.5, cliff_height=2):
+    slope = slopeLayer(heightmap)
+    heights = patchBlocks(heightmap, patch_size)
+    return {'slope': patchBlocks(slope, patch_size).mean(axis=2),
+            'max_slope': patchBlocks(slope, patch_size).max(axis=2),
+            'roughness': patchBlocks(roughnessLayer(heightmap, radius), patch_size).mean(axis=2),
+            'flatness': patchBlocks(flatnessLayer(slope, radius, max_slope), patch_size).mean(axis=2),
+            'cliff': patchBlocks(cliffMask(heightmap, cliff_height), patch_size).mean(axis=2),
+            'steep': heights.max(axis=2) - heights.min(axis=2) > patch_size - 1}
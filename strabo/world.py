@@ -1,16 +1,26 @@
-from gdpc import worldLoader as WL
-
-import cv2
 import numpy as np
-from matplotlib import pyplot as plt
-from tqdm import tqdm
 
-from .patch import Patch
-from .parcel import Parcel
+from .patch import Patch, PATCH_TYPES, UNDEVELOPABLE_TYPES, VIEW_RADIUS
+from .parcel import Parcel, ParcelList, DEVELOPMENT_TYPES
 from .roadnet import RoadNet
+from .footprint import DIRECTIONS, footprintCells, findFootprints, networkDistances
+from .layers import featureStage, terrainStage, waterDistances
+from .terrain import roadTerrainCost, terrainFeatureStage
+from .render import renderPatches
+from .roadgraph import RoadAnalytics, isConnected, roadComponents
+from .scores import ScoreCache
+from .surface import SurfaceSlice
+from .snapshot import WorldSnapshot
+from .availability import AvailabilityIndex
+from .backends import progress
 
 class World:
-    def __init__(self, STARTX, STARTY, STARTZ, ENDX, ENDY, ENDZ, patch_size=5):
+    ## water_resolution sets if water distances are measured between patches ('patch') or from the blocks of each patch ('block')
+    ## worldslice can be given to use another terrain source (e.g. a full gdpc WorldSlice, or anvil.RegionSlice for offline
+    ## world saves). By default only the surface is fetched from the server (see surface.SurfaceSlice)
+    ## cache (a stagecache.StageCache) stores the terrain analysis, so later runs over the same terrain skip it
+    def __init__(self, STARTX, STARTY, STARTZ, ENDX, ENDY, ENDZ, patch_size=5, water_resolution='patch', worldslice=None,
+                 cache=None):
         self.STARTX = STARTX
         self.STARTY = STARTY
         self.STARTZ = STARTZ 
@@ -19,15 +29,39 @@ class World:
         self.ENDZ = ENDZ 
         self.patch_size = patch_size
         self.ew = 63 # Default ocean elevation in Minecraft
-        self.parcels = []
+        self.parcels = ParcelList()
         self.roads = []
+        self.road_paths = [] # Paths of patches registered as roads, in order (see rasterize.rasterizeRoads)
+        self.version = 0 # Increased on every change to the world, used to invalidate cached data
+        self.parcel_shape = (4, 3) # Size (in patches) of a parcel: B/2 patches away from the road and 3 along it
+        self.footprints = None # Cached expansion direction of each patch (see getFootprints)
+        self.score_cache = ScoreCache(self) # Score features shared by the property agents
+        self.road_analytics = None # Cached analytics of the road network (see getRoadAnalytics)
+        self.availability = {} # Available patches of each development type (see getAvailability)
+        self.claim_conflicts = 0 # Parcels rejected for overlapping existing ones
     
-        self.WORLDSLICE = WL.WorldSlice(STARTX, STARTZ, ENDX + 1, ENDZ + 1)  
+        if (worldslice == None):
+            worldslice = SurfaceSlice(STARTX, STARTZ, ENDX + 1, ENDZ + 1)
+        self.WORLDSLICE = worldslice
         self.HEIGHTMAP = self.WORLDSLICE.heightmaps['MOTION_BLOCKING_NO_LEAVES']
 
         self.width, self.height = len(self.HEIGHTMAP) // patch_size, len(self.HEIGHTMAP[0]) // self.patch_size 
+        self.SURFACE_BLOCKS = self.getSurfaceBlocks() # Snapshot of the blocks under the heightmap
+        self.water_resolution = water_resolution
+        self.layers = self.getLayers(cache) # Patch types and terrain features of all patches
         self.patches = self.getPatches()
 
+        # Parcel owning each patch (0 if none) and development type (index of DEVELOPMENT_TYPES) of each parcel id
+        self.parcel_ids = np.zeros((self.width, self.height), dtype=np.int32)
+        self.parcel_table = {} # Parcel of each id
+        self.parcel_types = np.full(64, -1, dtype=np.int8)
+        self.next_parcel_id = 1
+        self.developable = np.array([[patch.developable for patch in row] for row in self.patches])
+
+        # Distance from each patch to the closest water, computed once for the whole map
+        self.water_distance = self.layers['water_distance'].copy()
+        self.setPatchWaterDistances()
+
         # Weights for each type of developer
         self.W = {
             "r": [.1, .2, 0, .3, .4, 0, 0, 0, 0, 0, 0],
@@ -40,7 +74,8 @@ class World:
         #self.patch_values, self.parcel_values = self.getValues() # Since this funcion is slow, store those values here (they have to be updated manually after avery development)
 
         ## Road network
-        self.road_graph = RoadNet(self.patches)
+        self.road_graph = RoadNet(self.patches, steep=self.layers['steep'],
+                                  terrain_cost=roadTerrainCost(self.layers['slope'], self.layers['cliff']))
         
         # Water and lava patches are impossible to pass in the road
         for patch in self.patches.flatten():
@@ -87,35 +122,66 @@ class World:
             if (not set(blocks).isdisjoint(patch_blocks)):
                 patch.type = 'road'
                 patch.developable = False
+                self.developable[patch.i, patch.j] = False
+        self.version += 1
  
     # Sets patches as roads
     def registerRoad(self, path):
+        self.road_paths.append(list(path))
         for p in path:
             self.patches[p].type = 'road'
             if self.patches[p] not in self.roads:
                 self.roads.append(self.patches[p])
             self.patches[p].developable = False
+            self.developable[p] = False
 
             # Updating dp for all developed patches
             for parcel in self.parcels:
                 for patch in parcel.patches:
                     patch.dp = min(patch.dp, self.patch_size*sum([abs(u - v) for u, v in zip((patch.i, patch.j), p)]) )
+        self.version += 1
+
+    # Proximity features of a patch computed by the score cache (see WorldSnapshot.setPatchFeatures)
+    def setPatchFeatures(self, patch, features):
+        for name, value in features.items():
+            setattr(patch, name, value)
 
     # Sets all blocks of a given patch as blocked in the road network 
     def addBlockedPatch(self, patch):
         self.road_graph.setBlocked((patch.i, patch.j))
+        self.version += 1
         return
 
+    # Sparse graph analytics of the road network, cached until the world changes
+    def getRoadAnalytics(self):
+        if (self.road_analytics == None or self.road_analytics.version != self.version):
+            self.road_analytics = RoadAnalytics(self)
+            self.road_analytics.version = self.version
+        return self.road_analytics
+
     def updateWorld(self):
         self.patch_values, self.parcel_values = self.getValues()
 
+    # Reads the blocks right under the heightmap for the whole (truncated) building area
+    def getSurfaceBlocks(self):
+        if (hasattr(self.WORLDSLICE, 'surface_blocks')): # Terrain source already decoded them
+            return self.WORLDSLICE.surface_blocks[:self.width*self.patch_size, :self.height*self.patch_size].copy()
+
+        blocks = np.empty((self.width*self.patch_size, self.height*self.patch_size), dtype=object)
+        for i in range(blocks.shape[0]):
+            for j in range(blocks.shape[1]):
+                # y coordinate returned from WorldSlice.heightmaps['MOTION_BLOCKING_NO_LEAVES']  is
+                # the air block on top. If we want to know the block type have to check bellow
+                blocks[i, j] = self.WORLDSLICE.getBlockAt(self.STARTX + i, self.HEIGHTMAP[i, j] - 1, self.STARTZ + j)
+        return blocks
+
     # Divides land into patches for development
     def getPatches(self):
         # Truncate building area based on the patch size
         width, height = self.width, self.height
 
         patches = []
-        for i in tqdm(range(0, width)):
+        for i in progress(range(0, width)):
             patches.append([])
             for j in range(0, height):
                 # Getting heights
@@ -125,12 +191,76 @@ class World:
                 coords = np.transpose(np.mgrid[self.STARTX + i*self.patch_size:self.STARTX + i*self.patch_size+self.patch_size, 
                                                      self.STARTZ + j*self.patch_size:self.STARTZ + j*self.patch_size+self.patch_size])
 
+                patch_blocks = self.SURFACE_BLOCKS[i*self.patch_size:i*self.patch_size+self.patch_size, 
+                                                   j*self.patch_size:j*self.patch_size+self.patch_size]
+
                 # Creating new patch of undeveloped land
-                patch = Patch(i, j, patch_heights, self.patch_size, coords, self.WORLDSLICE)
+                patch = Patch(i, j, patch_heights, self.patch_size, coords, self.WORLDSLICE, blocks=patch_blocks,
+                              patch_type=PATCH_TYPES[self.layers['types'][i, j]])
+                patch.eh, patch.ev, patch.epv = [self.layers[layer][i, j] for layer in ['eh', 'ev', 'epv']]
+                patch.slope, patch.roughness, patch.flatness, patch.cliff = [self.layers[layer][i, j] for layer in
+                                                                             ['slope', 'roughness', 'flatness', 'cliff']]
                 patches[i].append(patch)
         patches = np.array(patches)
         return patches
 
+    # Runs the deterministic preprocessing stages (terrain analysis, then feature layers) for the whole map.
+    ## With a StageCache their outputs are stored on disk and reused by runs over the same terrain and parameters
+    def getLayers(self, cache=None, e_offset=10):
+        def run(stage, compute, inputs, params):
+            if (cache == None):
+                return compute(**inputs, **params)
+            return cache.run(stage, compute, inputs, params)
+
+        size = self.patch_size
+        terrain = run('terrain', terrainStage,
+                      {'heightmap': self.HEIGHTMAP[:self.width*size, :self.height*size], 'surface_blocks': self.SURFACE_BLOCKS},
+                      {'patch_size': size})
+        features = run('features', featureStage,
+                       {**terrain, 'surface_water': self.SURFACE_BLOCKS == 'minecraft:water'},
+                       {'patch_size': size, 'view_radius': VIEW_RADIUS, 'e_offset': e_offset, 'water_resolution': self.water_resolution})
+        terrain_features = run('terrain_features', terrainFeatureStage,
+                               {'heightmap': self.HEIGHTMAP[:self.width*size, :self.height*size]}, {'patch_size': size})
+        return {**terrain, **features, **terrain_features}
+
+    # Euclidean distance (in blocks) from every patch to the closest water. Infinite if there is no water
+    def getWaterDistances(self):
+        water = np.array([[patch.type == 'water' for patch in row] for row in self.patches])
+        return waterDistances(water, self.SURFACE_BLOCKS == 'minecraft:water', self.patch_size, self.water_resolution)
+
+    # Copies the water distances into the patches
+    def setPatchWaterDistances(self):
+        for patch in self.patches.flatten():
+            patch.dwater = self.water_distance[patch.i, patch.j]
+
+    # Updates water distances, road blocking and where can be built after the given patches became, or stopped being, water
+    def updateWater(self, patches):
+        if (self.water_resolution == 'patch' and all(patch.type == 'water' for patch in patches)):
+            # Only new water: distances can only decrease, no need to recompute the whole map
+            ii, jj = np.indices(self.water_distance.shape)
+            for patch in patches:
+                distance = self.patch_size*np.hypot(ii - patch.i, jj - patch.j)
+                self.water_distance = np.minimum(self.water_distance, distance)
+        else:
+            self.water_distance = self.getWaterDistances()
+        self.setPatchWaterDistances()
+
+        for patch in patches:
+            if patch.type in ["water", "lava"]:
+                self.road_graph.setBlocked((patch.i, patch.j))
+            elif patch.parcel == None:
+                self.road_graph.setUnblocked((patch.i, patch.j))
+
+            self.layers['types'][patch.i, patch.j] = PATCH_TYPES.index(patch.type)
+            patch.developable = patch.type not in UNDEVELOPABLE_TYPES
+            self.developable[patch.i, patch.j] = patch.developable
+        self.version += 1
+
+        # Land that stopped being water can be built again (new water is dropped by the indices when it is reached)
+        for index in self.availability.values():
+            for patch in patches:
+                index.add(patch, restore=False)
+
     # Utility function to normalize the individual parameters before calculating final value 
     def normalizeParameter(self, value, map_values):
         if (value == 0):
@@ -212,139 +342,178 @@ class World:
 
     # Returns the distance of a patch the the network
     def getPatchNetworkDistance(self, patch):
-        roads = [patch for patch in self.patches.flatten() if patch.type=="road"]
-        dist = np.inf
-        for net_patch in roads:
-            dist = min(dist, self.patch_size*sum([abs(u - v) for u, v in zip((patch.i, patch.j), (net_patch.i, net_patch.j))]))
+        dist = self.getNetworkDistances()[patch.i, patch.j]
         
         patch.dp = dist
         return dist
 
-    # Given a starting patch and a certain devleopment type, select some of its neighbours to make a new parcel
-    def createParcel(self, initial_patch, development_type):
-        B = 8 # Size of a block
-        parcel_patches = [initial_patch] # Patches that will make up the new parcel
-        print(f"Patch {(initial_patch.i, initial_patch.j)}, developable: {initial_patch.developable}, Type: {initial_patch.type}, Step: Initial")
-
-        
-        # Step 1: chooding a direction to expand away form the network
-        possible_directions = [(0,1), (1, 0), (-1, 0), (0, -1)]
-        expand_direction = None
-        for direction in possible_directions:
-            if ((direction[0] + initial_patch.i < 0) or (direction[0] + initial_patch.i >= self.width) or
-               (direction[1] + initial_patch.j < 0) or (direction[1] + initial_patch.j >= self.height)): # Checking if is in bounds
-               continue
-            
-            # Checking if next patch is going away from the road network as intended and has the other requirements
-            next_patch = self.patches[direction[0] + initial_patch.i, direction[1] + initial_patch.j]
-            if (next_patch.developable and (self.getPatchNetworkDistance(next_patch) > self.getPatchNetworkDistance(initial_patch)
-                                            or self.getPatchNetworkDistance(initial_patch) == np.inf)):
-                expand_direction = direction
-                break # Next position chosen
+    # Distance of every patch to the road network
+    def getNetworkDistances(self):
+        roads = np.array([[patch.type == "road" for patch in row] for row in self.patches])
+        return self.patch_size*networkDistances(roads)
+
+    # Expansion direction (index in DIRECTIONS) of a parcel started at each patch, or -1 where no parcel fits
+    ## Computed for the whole grid at once and cached until the world changes
+    def getFootprints(self):
+        if (self.footprints == None or self.footprints[0] != self.version):
+            free = self.developable & (self.parcel_ids == 0)
+            directions = findFootprints(free, self.getNetworkDistances(), *self.parcel_shape)
+            self.footprints = (self.version, directions)
+        return self.footprints[1]
+
+    # Checks if a parcel can be started in this patch
+    def isFeasibleSeed(self, patch):
+        return self.getFootprints()[patch.i, patch.j] >= 0
+
+    # Given a starting patch, select some of its neighbours to make a new parcel (does not change the world)
+    ## Returns the selected patches and the expansion direction, or None if no parcel fits there
+    def planParcel(self, initial_patch):
+        # Choosing a direction to expand away form the network where the whole parcel fits
+        direction_idx = self.getFootprints()[initial_patch.i, initial_patch.j]
 
         # Unable to expand the parcel
         # TO DO: try attaching to a neighboring parcel
-        if(expand_direction==None):
+        if (direction_idx < 0):
             return
         
-        # Step 2: expanding B/2 blocks in that direction
-        for i in range(int(B/2)):
-            last_patch = initial_patch
-            next_patch = self.patches[expand_direction[0] + last_patch.i, expand_direction[1] + last_patch.j]
-            if (not next_patch.developable):
-                break
-            print(f"Patch {(next_patch.i, next_patch.j)}, developable: {next_patch.developable}, Type: {next_patch.type}, Step: Expanding")
-            parcel_patches.append(next_patch)
-            last_patch = next_patch
-        if (i < 3): # Unable to expand at least 3 patches
-            return
-
-        # Step 3: widening selected patch strip
-        for i in range(3):
-            widening_patches = []
-            wide_direction = expand_direction[::-1] # widening direction is perpendicular to the expand direction
-            for patch in parcel_patches:
-                if ((wide_direction[0] + patch.i < 0) or (wide_direction[0] + patch.i >= self.width) or
-                (wide_direction[1] + patch.j < 0) or (wide_direction[1] + patch.j >= self.height)): # Checking if is in bounds
-                    continue
-
-                next_patch = self.patches[wide_direction[0] + patch.i, wide_direction[1] + patch.j]
-                if (next_patch.developable):
-                    print(f"Patch {(next_patch.i, next_patch.j)}, developable: {next_patch.developable}, Type: {next_patch.type}, Step: Widening")
-                    widening_patches.append(next_patch)
+        # Parcel is B/2 patches long in the expand direction and widened perpendicular to it
+        expand_direction = DIRECTIONS[direction_idx]
+        cells = footprintCells((initial_patch.i, initial_patch.j), expand_direction, *self.parcel_shape)
+        parcel_patches = [self.patches[cell] for cell in cells]
+
+        return parcel_patches, expand_direction
+
+    # Patches that are free to build on and distinct parcels inside a window of the map
+    ## Returns the free patches (developable, without parcel), the ids of the parcels and their development type codes
+    def getRegion(self, i_range, j_range):
+        window = (slice(*i_range), slice(*j_range))
+        developable = self.developable[window]
+        ids = self.parcel_ids[window]
+
+        free_patches = self.patches[window][developable & (ids == 0)]
+        parcel_ids = np.unique(ids[developable & (ids != 0)])
+        return free_patches, parcel_ids, self.parcel_types[parcel_ids]
+
+    # Number of free patches and of distinct parcels of each development type inside a window of the map
+    def getRegionCounts(self, i_range, j_range):
+        free_patches, parcel_ids, parcel_types = self.getRegion(i_range, j_range)
+        counts = np.bincount(parcel_types, minlength=len(DEVELOPMENT_TYPES))
+        return len(free_patches), {t: int(n) for t, n in zip(DEVELOPMENT_TYPES, counts)}
+
+    # Checks if the road network could still reach the given parcel patches, and the parcels waiting for a road, once
+    ## these patches are blocked. Uses the connected components of the passable patches, so no path is searched
+    def isReachableBlocking(self, parcel_patches):
+        if (len(self.roads) == 0): # No network yet, every parcel is connected later
+            return True
+
+        roads = np.zeros((self.width, self.height), dtype=bool)
+        roads[([p.i for p in self.roads], [p.j for p in self.roads])] = True
+        passable = self.road_graph.getPassable()
+        reachable_before = roadComponents(passable, roads)
+
+        goals = np.zeros((self.width, self.height), dtype=bool)
+        goals[([p.i for p in parcel_patches], [p.j for p in parcel_patches])] = True
+        passable &= ~goals
+        components = roadComponents(passable, roads)
+        if (not isConnected(goals, roads, *components)):
+            return False
+
+        # Parcels still waiting for a road can not be cut off by the new one
+        for parcel in self.parcels:
+            if (parcel.connected):
+                continue
+            waiting = self.parcel_ids == parcel.id
+            if (isConnected(waiting, roads, *reachable_before) and not isConnected(waiting, roads, *components)):
+                return False
+        return True
 
-            parcel_patches += widening_patches
+    # Turns a planned set of patches into a parcel, failing if any of them was already claimed by another parcel
+    ## With transactional, the parcel is only claimed if the road network can still reach it (and the other parcels
+    ## waiting for a road) with its patches blocked; they are then blocked for roads in the same step. A rejected
+    ## parcel leaves the world unchanged
+    def claimParcel(self, parcel_patches, expand_direction, development_type, transactional=False):
+        cells = ([patch.i for patch in parcel_patches], [patch.j for patch in parcel_patches])
 
         # Check if patches dont already belong to an existing parcel
-        for patch in parcel_patches:
-            if patch.parcel != None:
-                print("Trying to assign patch already used in another parcel.")
-                return
+        if (self.parcel_ids[cells].any()):
+            self.claim_conflicts += 1
+            return
+        if (transactional and not self.isReachableBlocking(parcel_patches)):
+            return
 
         new_parcel = Parcel(*parcel_patches, expand_direction=expand_direction, development_type=development_type)
         for patch in parcel_patches:
             patch.parcel = new_parcel
             patch.undeveloped = False
-            print(f"Setting ({patch.i}, {patch.j}) developed")
+
+        # Registering in the id grid and parcel table
+        new_parcel.id = self.next_parcel_id
+        self.next_parcel_id += 1
+        if (new_parcel.id >= len(self.parcel_types)):
+            self.parcel_types = np.concatenate([self.parcel_types, np.full(len(self.parcel_types), -1, dtype=np.int8)])
+        self.parcel_types[new_parcel.id] = DEVELOPMENT_TYPES.index(development_type)
+        self.parcel_ids[cells] = new_parcel.id
+        self.parcel_table[new_parcel.id] = new_parcel
+
         self.parcels.append(new_parcel)
+        self.version += 1
+
+        if (transactional):
+            for patch in parcel_patches: # Preventing roads to be built on top of this parcel
+                self.road_graph.setBlocked((patch.i, patch.j))
 
         return new_parcel
 
+    # Priority queue of the patches available to a development type, created with the given score function on first use
+    def getAvailability(self, development_type, score, scores=None):
+        if (development_type not in self.availability):
+            self.availability[development_type] = AvailabilityIndex(self, score, scores)
+        return self.availability[development_type]
+
+    # Given a starting patch and a certain devleopment type, select some of its neighbours to make a new parcel
+    ## transactional works as in claimParcel
+    def createParcel(self, initial_patch, development_type, transactional=False):
+        plan = self.planParcel(initial_patch)
+        if (plan == None):
+            return
+        
+        return self.claimParcel(*plan, development_type=development_type, transactional=transactional)
+
+    # Copy-on-write snapshot of the world for what-if evaluation (see snapshot.WorldSnapshot)
+    def fork(self):
+        return WorldSnapshot(self)
+
     def destroyParcel(self, parcel):
         for patch in parcel.patches:
             patch.parcel = None
             patch.undeveloped = True
             patch.type = 'land'
             self.road_graph.setUnblocked((patch.i, patch.j))
+            self.parcel_ids[patch.i, patch.j] = 0
+        del self.parcel_table[parcel.id]
+        self.parcel_types[parcel.id] = -1
         self.parcels.remove(parcel)
+        self.version += 1
+
+        # The freed patches, and the neighbours where a parcel may fit again, are available again
+        radius = max(self.parcel_shape)
+        for index in self.availability.values():
+            for patch in parcel.patches:
+                index.add(patch)
+            for patch in parcel.patches:
+                for neighbour in self.patches[max(0, patch.i - radius):patch.i + radius + 1,
+                                              max(0, patch.j - radius):patch.j + radius + 1].flatten():
+                    index.add(neighbour, restore=False)
         del parcel
 
+    # Image of the map divided in patches (see render.renderPatches)
+    def getFrame(self, scale=1):
+        return renderPatches(self, scale=scale)
+
     # Visualize map divided in patches
     def plotPatches(self, title=None):
-        R,G,B = np.zeros([3, self.width, self.height], dtype=np.uint8)
-
-        for i, x in enumerate(self.patches):
-            for j, y in enumerate(x):
-                if (y.type=='water'):
-                    B[i,j] = 254
-                elif (y.type=='lava'):
-                    R[i,j] = 254
-                elif (y.type=='land'):
-                    G[i,j] = 254
-                    B[i,j] = 100
-                elif (y.type=='tree'):
-                    G[i,j] = 254/2
-                elif (y.type=='cave'):
-                    G[i,j] = 100
-                    B[i,j] = 100
-                    R[i,j] = 100
-                elif (y.type=='road'):
-                    G[i,j] = 0
-                    B[i,j] = 0
-                    R[i,j] = 0
-                else:
-                    G[i,j] = 254
-                    B[i,j] = 254
-                    R[i,j] = 254
-
-        for parcel in self.parcels: # Seeing parcels
-            for patch in parcel.patches:
-                if parcel.development_type == 'Vr': 
-                    G[patch.i,patch.j] = 254
-                    B[patch.i,patch.j] = 254
-                    R[patch.i,patch.j] = 0
-
-                elif parcel.development_type == 'Vc': 
-                    G[patch.i,patch.j] = 254
-                    B[patch.i,patch.j] = 0
-                    R[patch.i,patch.j] = 254
-
-                elif parcel.development_type == 'Vi': 
-                    G[patch.i,patch.j] = 100
-                    B[patch.i,patch.j] = 100
-                    R[patch.i,patch.j] = 254
-
-        RGB = np.array([R,G,B]).T
+        from matplotlib import pyplot as plt # Only loaded for plotting (see backends)
+        RGB = self.getFrame()
 
         plt.figure()
         if title:
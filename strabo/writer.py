@@ -0,0 +1,69 @@
+import queue
+import threading
+
+# Writes items in a background thread, so the simulation does not wait for the output. Subclasses write each item in
+## writeItem and close their output in finish (both run in the writer thread). If the writer falls behind and its queue
+## is full, new items are dropped (see dropped). An error in the writer stops it, and is raised by the next put or close
+class BackgroundWriter:
+    def __init__(self, queue_size=64):
+        self.dropped = 0
+        self.error = None # Exception that stopped the writer
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, *args):
+        # An error of the writer would hide the one already being raised
+        self.close(raise_error=error_type == None)
+
+    def raiseError(self):
+        if (self.error != None):
+            raise self.error
+
+    # Queues an item for writing. Returns False if the item had to be dropped
+    def put(self, item):
+        self.raiseError()
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    # Writes the remaining items and closes the output. If the writer stopped, its queue is not waited for
+    def close(self, raise_error=True):
+        while (self.thread.is_alive()):
+            try:
+                self.queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.thread.join()
+        if (raise_error):
+            self.raiseError()
+
+    def run(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if (item is None):
+                    break
+                self.writeItem(item)
+        except Exception as error:
+            self.error = error
+        finally:
+            try:
+                self.finish()
+            except Exception as error:
+                if (self.error == None):
+                    self.error = error
+
+    def writeItem(self, item):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
@@ -8,51 +8,14 @@ from gdpc import worldLoader as WL
 from strabo.world import World
 from strabo.agents.property import PropertyDeveloper
 from strabo.agents.road import RoadDeveloper
+from strabo.commit import CommitPlanner
+from strabo.metrics import MetricsStream
+from strabo.simulation import buildCity
 
 
-def buildCity(world, *property_agents, road_agent, steps): 
-    # Start by building a first property
-    while(len(world.parcels)==0):
-        property_agents[0].interact()
-    # Build the start of the road
-    for i in range(50):
-        road_agent.runExplore() 
-
-    start_point = (world.parcels[0].i, world.parcels[0].j)
-    path = []
-    while (len(path)==0): # Build at least one road
-        dest_patch = np.random.choice(world.patches.flatten())
-        end_point = (dest_patch.i, dest_patch.j)
-        path = world.road_graph.findPath(start_point, end_point)
-    world.registerRoad(path) 
-    world.plotPatches()
-    for i in range(steps):
-        for agent in property_agents:
-            agent.buildNew()
-            #world.plotPatches()
-
-        road_agent.interact()
-        #world.plotPatches()
-        
-
-def commitToWorld(world):
-    blocks = ['oak_planks', 'dark_oak_planks', 'acacia_planks']
-    for patch in world.patches.flatten():
-        if (patch.undeveloped == False):
-            block = np.random.choice(blocks)
-            x, z = patch.xz_coordinates.T
-            y = patch.region_heights.flatten()
-            for i, j, k in zip(x.flatten(), y.flatten(), z.flatten()):
-                print(i, j, k)
-                INTF.placeBlock(i, j-1, k, block)
-
-        if (patch.type == "road"):
-            block = 'obsidian'
-            x, z = patch.xz_coordinates.T
-            y = patch.region_heights.flatten()
-            for i, j, k in zip(x.flatten(), y.flatten(), z.flatten()):
-                print(i, j, k)
-                INTF.placeBlock(i, j-1, k, block)
+def commitToWorld(world, planner):
+    # Only blocks that differ from what is already in the world are placed
+    return planner.commit(INTF.placeBlock)
 
 
 # Seleciona região ao redor do jogador
@@ -62,9 +25,10 @@ world = World(STARTX, STARTY, STARTZ, ENDX, ENDY, ENDZ, patch_size=5)
 r_agent = PropertyDeveloper(world, "Vr")
 c_agent = PropertyDeveloper(world, "Vc")
 i_agent = PropertyDeveloper(world, "Vi")
-road_agent = RoadDeveloper(world, explorers = 100)
+road_agent = RoadDeveloper(world, explorers = 100, batched=True)
 
-buildCity(world, r_agent, c_agent, i_agent, road_agent=road_agent, steps=10)
+with MetricsStream("metrics.csv") as metrics:
+    buildCity(world, r_agent, c_agent, i_agent, road_agent=road_agent, steps=10, plot=True, metrics=metrics)
 
 world.plotPatches()
 
@@ -80,4 +44,4 @@ world.plotPatches()
 '''
 x = input("commit? ")
 if (x == 'y'):  
-    commitToWorld(world)
+    commitToWorld(world, CommitPlanner(world))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from strabo.world import World
+
+# Terrain source with the interface of surface.SurfaceSlice, built from a heightmap and surface blocks in memory
+class TerrainSlice:
+    def __init__(self, x1, z1, heightmap, surface_blocks):
+        self.rect = x1, z1, heightmap.shape[0] - 1, heightmap.shape[1] - 1
+        self.heightmaps = {'MOTION_BLOCKING_NO_LEAVES': heightmap}
+        self.surface_blocks = surface_blocks
+
+    def getBlockAt(self, x, y, z):
+        i, j = x - self.rect[0], z - self.rect[1]
+        if (y == self.heightmaps['MOTION_BLOCKING_NO_LEAVES'][i, j] - 1):
+            return self.surface_blocks[i, j]
+        return 'minecraft:stone'
+
+# Rolling grass land with a lake and a small wood
+def makeTerrain(size):
+    x, z = np.mgrid[0:size + 1, 0:size + 1]
+    heightmap = (64 + 4*np.sin(x/15) + 3*np.cos(z/11)).astype(np.int64)
+    blocks = np.full(heightmap.shape, 'minecraft:grass_block', dtype=object)
+    blocks[(x - 30)**2 + (z - 40)**2 < 80] = 'minecraft:water'
+    blocks[(x > 70) & (x < 74) & (z < 20)] = 'minecraft:oak_log'
+    return heightmap, blocks
+
+@pytest.fixture
+def make_world():
+    def make(size=100, patch_size=5, heightmap=None, blocks=None):
+        if (heightmap is None):
+            heightmap, blocks = makeTerrain(size)
+        np.random.seed(0)
+        return World(0, 0, 0, size - 1, 255, size - 1, patch_size=patch_size,
+                     worldslice=TerrainSlice(0, 0, heightmap, blocks))
+    return make
@@ -0,0 +1,24 @@
+from strabo.agents.property import PropertyDeveloper
+
+def test_patch_feasible_again_is_returned(make_world, monkeypatch):
+    world = make_world()
+    index = PropertyDeveloper(world, "Vr").availability
+    best = index.top(1)[0]
+
+    # No parcel fits in the best patch for now: it is skipped, but kept
+    feasible = world.isFeasibleSeed
+    monkeypatch.setattr(world, 'isFeasibleSeed', lambda patch: patch is not best and feasible(patch))
+    assert best not in index.top(len(index))
+
+    # Once the world changes and a parcel fits there again, it is returned again
+    monkeypatch.setattr(world, 'isFeasibleSeed', feasible)
+    world.version += 1
+    assert index.top(1)[0] is best
+
+def test_considered_patch_is_not_returned(make_world):
+    world = make_world()
+    agent = PropertyDeveloper(world, "Vr")
+    best = agent.availability.top(1)[0]
+    agent.consider(best)
+    world.version += 1
+    assert best not in agent.availability.top(len(agent.availability))
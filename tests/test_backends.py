@@ -0,0 +1,15 @@
+from strabo.backends import importTime
+
+# Headless core: the modules worker processes import (see regions.simulateRegion)
+CORE_MODULES = ['strabo.world', 'strabo.anvil', 'strabo.surface', 'strabo.agents.property', 'strabo.agents.road',
+                'strabo.agents.scheduler', 'strabo.simulation', 'strabo.regions']
+
+# The core imports without the optional backends (NBT or gdpc are only loaded when terrain is read), and fast enough
+## to start worker processes often. The bound is generous (numpy and scipy alone take a fair part of it); the measured
+## time is reported in the test properties (e.g. pytest --junitxml)
+def test_core_imports_fast_without_optional_backends(record_property):
+    elapsed, loaded = importTime(*CORE_MODULES)
+    record_property('import_time', elapsed)
+    print(f"Import time of the core: {elapsed:.3f}s")
+    assert loaded == []
+    assert elapsed < 5
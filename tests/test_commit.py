@@ -0,0 +1,34 @@
+import numpy as np
+
+from strabo.agents.property import PropertyDeveloper
+from strabo.agents.road import RoadDeveloper
+from strabo.commit import CommitPlanner
+from strabo.simulation import buildCity
+
+def test_recommitted_roads_leave_no_old_blocks(make_world):
+    world = make_world()
+    agents = [PropertyDeveloper(world, agent_type) for agent_type in ["Vr", "Vc", "Vi"]]
+    road_agent = RoadDeveloper(world, explorers=5)
+    buildCity(world, *agents, road_agent=road_agent, steps=3)
+
+    # Blocks written to Minecraft, over the terrain of the snapshot
+    planner = CommitPlanner(world)
+    placed = {}
+    placeBlock = lambda x, y, z, block: placed.__setitem__((x, y, z), block)
+    planner.commit(placeBlock)
+    for k in range(5):
+        for agent in agents:
+            agent.buildNew()
+        road_agent.connect()
+    planner.commit(placeBlock)
+
+    layout, heights = planner.current, planner.current_heights
+    ground = planner.ground
+    roads = {(world.STARTX + i, heights[i, j], world.STARTZ + j) for i, j in zip(*np.nonzero(layout == planner.road_block))}
+    assert {position for position, block in placed.items() if block == planner.road_block} == roads
+
+    # Cuts are open above the road and raised cells are filled under it
+    for x, y, z in roads:
+        g = ground[x - world.STARTX, z - world.STARTZ]
+        assert all(placed[(x, h, z)] == 'minecraft:air' for h in range(y + 1, g + 1))
+        assert all(placed[(x, h, z)] == planner.fill_block for h in range(g + 1, y))
@@ -0,0 +1,64 @@
+import numpy as np
+from scipy.sparse import csgraph
+
+from strabo.roadnet import FOUND
+
+# Cost from every patch to the closest goal, from a fresh Dijkstra search of the whole grid
+def freshCosts(road_graph, goals):
+    passable = road_graph.getPassable()
+    for goal in goals:
+        passable[goal] = True
+    graph = road_graph.getTrafficGraph(passable)
+    height = len(road_graph.Z)
+    return csgraph.dijkstra(graph.T.tocsr(), indices=[i*height + j for i, j in goals], min_only=True).reshape(-1, height)
+
+def test_incremental_search_matches_fresh_search(make_world):
+    world = make_world()
+    road_graph = world.road_graph
+    rng = np.random.default_rng(0)
+    goals = [(5, 5), (5, 6)]
+    planner = road_graph.getPlanner(goals[0], goals[1:])
+
+    for k in range(60):
+        change = k % 4
+        position = (int(rng.integers(world.width)), int(rng.integers(world.height)))
+        if (change == 0):
+            road_graph.setBlocked(position)
+        elif (change == 1 and len(road_graph.blocked) != 0):
+            road_graph.setUnblocked(sorted(road_graph.blocked)[0])
+        elif (change == 2 and position[0] + 1 < world.width):
+            road_graph.setRoad([position, (position[0] + 1, position[1])])
+
+        start = (int(rng.integers(world.width)), int(rng.integers(world.height)))
+        result = planner.search(start)
+        cost = freshCosts(road_graph, goals)[start]
+        if (cost == np.inf):
+            assert result.status != FOUND
+        else:
+            assert result.status == FOUND and abs(result.cost - cost) < 1e-9
+            assert result.path[0] == start and result.path[-1] in goals
+        road_graph.useEdges([result.path])
+
+def test_network_planner_follows_the_growing_network(make_world):
+    world = make_world()
+    road_graph = world.road_graph
+    rng = np.random.default_rng(1)
+    roads = [(10, j) for j in range(5, 15)]
+    road_graph.setRoad(roads)
+
+    for k in range(20):
+        starts = [(int(rng.integers(world.width)), int(rng.integers(world.height)))]
+        starts.append((starts[0][0], min(starts[0][1] + 1, world.height - 1)))
+        path = road_graph.findConnection(starts, roads)
+        result = road_graph.last_search
+        cost = freshCosts(road_graph, roads)[tuple(np.transpose(starts))].min()
+        if (cost == np.inf):
+            assert result.status != FOUND
+        else:
+            assert result.status == FOUND and abs(result.cost - cost) < 1e-9
+            assert path[0] in roads and path[-1] in starts
+
+            # The connection becomes part of the network, as in RoadDeveloper.connect
+            road_graph.setRoad(path)
+            roads = roads + [position for position in path if position not in roads]
+        road_graph.setBlocked((int(rng.integers(world.width)), int(rng.integers(world.height))))
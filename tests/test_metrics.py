@@ -0,0 +1,40 @@
+import threading
+
+import numpy as np
+import pytest
+
+from strabo.metrics import MetricsStream
+
+def test_rows_are_written(tmp_path):
+    for name in ["metrics.csv", "metrics.npz"]:
+        with MetricsStream(str(tmp_path/name), flush_every=2) as metrics:
+            for tick in range(5):
+                metrics.record({'tick': tick, 'parcels': 2*tick})
+        if (name.endswith(".npz")):
+            assert list(np.load(tmp_path/name)['parcels']) == [0, 2, 4, 6, 8]
+        else:
+            assert len((tmp_path/name).read_text().splitlines()) == 6
+
+def test_writer_error_is_raised_without_hanging(tmp_path):
+    metrics = MetricsStream(str(tmp_path/"missing"/"metrics.csv"), queue_size=1)
+    metrics.record({'tick': 0})
+    metrics.thread.join(5) # The writer stops on the missing directory
+    for tick in range(10): # Filling the queue
+        try:
+            metrics.record({'tick': tick})
+        except OSError:
+            break
+    else:
+        pytest.fail("error of the writer not raised by record")
+
+    errors = []
+    def close():
+        try:
+            metrics.close()
+        except OSError as error:
+            errors.append(error)
+    closing = threading.Thread(target=close, daemon=True)
+    closing.start()
+    closing.join(5)
+    assert not closing.is_alive()
+    assert len(errors) == 1
@@ -0,0 +1,46 @@
+import pytest
+
+from strabo.parcel import Parcel, ParcelList
+
+# Patch with only the position a parcel needs
+class PatchStub:
+    def __init__(self, i, j):
+        self.i, self.j = i, j
+
+def makeParcels(n):
+    return [Parcel(PatchStub(k, 0), expand_direction=(1, 0), development_type='Vr') for k in range(n)]
+
+def test_remove_keeps_indices():
+    parcels = ParcelList()
+    a, b, c, d = makeParcels(4)
+    parcels.extend([a, b, c])
+    parcels.append(d)
+    parcels.remove(b)
+    assert parcels == [a, d, c] and b.index == None
+    assert all(parcels[parcel.index] is parcel for parcel in parcels)
+    assert parcels.pop(0) is a and parcels == [c, d]
+    assert all(parcels[parcel.index] is parcel for parcel in parcels)
+
+def test_remove_rejects_parcels_not_in_list():
+    parcels = ParcelList()
+    a, b, c = makeParcels(3)
+    parcels.extend([a, b])
+    parcels.remove(a)
+    with pytest.raises(ValueError):
+        parcels.remove(a) # Already removed
+    with pytest.raises(ValueError):
+        parcels.remove(c) # Never added
+    c.index = 0
+    with pytest.raises(ValueError):
+        parcels.remove(c) # Index of another list
+    assert parcels == [b] and b.index == 0
+
+def test_moving_parcels_is_not_supported():
+    parcels = ParcelList()
+    parcels.extend(makeParcels(2))
+    with pytest.raises(TypeError):
+        parcels.insert(0, makeParcels(1)[0])
+    with pytest.raises(TypeError):
+        del parcels[0]
+    with pytest.raises(TypeError):
+        parcels.sort()
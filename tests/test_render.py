@@ -0,0 +1,32 @@
+import shutil
+import threading
+
+import numpy as np
+import pytest
+
+from strabo.render import FrameWriter, renderPatches
+
+def test_frames_are_written(make_world, tmp_path):
+    world = make_world()
+    frame = renderPatches(world, scale=2)
+    assert frame.shape == (2*world.height, 2*world.width, 3)
+    with FrameWriter(str(tmp_path/"frames")) as frames:
+        for k in range(3):
+            frames.write(frame)
+    assert frames.frames == 3
+    assert len(list((tmp_path/"frames").iterdir())) == 3
+
+def test_writer_error_is_raised_without_hanging(tmp_path):
+    frames = FrameWriter(str(tmp_path/"frames"), queue_size=1)
+    shutil.rmtree(tmp_path/"frames") # Frames can not be written anymore
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    frames.write(frame)
+    frames.thread.join(5)
+    with pytest.raises(Exception):
+        for k in range(10): # Filling the queue
+            frames.write(frame)
+
+    closing = threading.Thread(target=lambda: pytest.raises(Exception, frames.close), daemon=True)
+    closing.start()
+    closing.join(5)
+    assert not closing.is_alive()
@@ -0,0 +1,8 @@
+def test_articulation_points_are_computed_on_request(make_world):
+    world = make_world(size=50)
+    world.registerRoad([(2, j) for j in range(2, 7)])
+    analytics = world.getRoadAnalytics()
+    assert analytics.articulation_points == None
+
+    # The inner patches of a straight road split it, its ends do not
+    assert sorted(analytics.getArticulationPoints()) == [(2, j) for j in range(3, 6)]
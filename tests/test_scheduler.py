@@ -0,0 +1,21 @@
+from strabo.agents.property import PropertyDeveloper
+from strabo.agents.road import RoadDeveloper
+from strabo.agents.scheduler import AgentScheduler
+from strabo.simulation import startCity
+
+# Only claims lost to overlapping parcels are conflicts, not the ones rejected for lack of road access
+def test_conflicts_match_world_claim_conflicts(make_world):
+    world = make_world()
+    agents = [PropertyDeveloper(world, agent_type) for agent_type in ["Vr", "Vc", "Vc", "Vi"]]
+    road_agent = RoadDeveloper(world, explorers=5)
+    startCity(world, *agents, road_agent=road_agent)
+
+    scheduler = AgentScheduler(world, *agents)
+    conflicts, built = 0, 0
+    start = world.claim_conflicts
+    for tick in range(5):
+        built += scheduler.step()
+        conflicts += scheduler.conflicts
+        road_agent.connect()
+    assert built != 0
+    assert conflicts == world.claim_conflicts - start
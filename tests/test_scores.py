@@ -0,0 +1,16 @@
+import numpy as np
+
+from strabo.agents.property import PropertyDeveloper
+from strabo.agents.road import RoadDeveloper
+from strabo.simulation import buildCity
+
+def test_score_grids_match_patch_scores(make_world):
+    world = make_world()
+    agents = [PropertyDeveloper(world, agent_type) for agent_type in ["Vr", "Vc", "Vi"]]
+    buildCity(world, *agents, road_agent=RoadDeveloper(world, explorers=5), steps=5)
+    assert len(world.parcels) > 3
+
+    for agent in agents:
+        scores = agent.getScores()[agent.agent_type]
+        expected = np.array([[agent.getScore(patch)[agent.agent_type] for patch in row] for row in world.patches])
+        assert np.allclose(scores, expected, rtol=1e-12, atol=1e-12)
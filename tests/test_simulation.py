@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from strabo.agents.property import PropertyDeveloper
+from strabo.agents.road import RoadDeveloper
+from strabo import regions
+from strabo.simulation import NoRoadError, buildCityTimed, startCity
+
+def makeAgents(world, explorers=20):
+    return [PropertyDeveloper(world, agent_type) for agent_type in ["Vr", "Vc", "Vi"]], RoadDeveloper(world, explorers=explorers)
+
+def test_connect_keeps_parcels_when_out_of_budget(make_world):
+    world = make_world()
+    property_agents, road_agent = makeAgents(world)
+    startCity(world, *property_agents, road_agent=road_agent)
+    for agent in property_agents*3:
+        agent.buildNew()
+    unconnected = [parcel for parcel in world.parcels if not parcel.connected]
+    assert len(unconnected) != 0
+
+    # No search can finish, so no parcel is shown to be unreachable
+    world.road_graph.max_expansions = 1
+    road_agent.connect()
+    assert road_agent.destroyed == 0
+    assert all(parcel in world.parcels for parcel in unconnected)
+
+    # With the budget back, they are connected on the next tick
+    world.road_graph.max_expansions = None
+    road_agent.connect()
+    assert road_agent.connected != 0
+
+def test_timed_run_does_not_destroy_parcels_out_of_budget(make_world):
+    world = make_world()
+    property_agents, road_agent = makeAgents(world)
+    world.road_graph.max_expansions = 1 # Every search of the run stops before it can tell if a parcel is reachable
+    buildCityTimed(world, *property_agents, road_agent=road_agent, budget=1, steps=20, commit_reserve=0)
+    assert road_agent.destroyed == 0
+    assert len(world.parcels) > 1
+
+def test_start_city_searches_without_time_limit_when_out_of_time(make_world):
+    world = make_world()
+    property_agents, road_agent = makeAgents(world)
+    world.road_graph.time_limit = 0 # Every timed search stops before expanding anything
+    startCity(world, *property_agents, road_agent=road_agent, road_attempts=5)
+    assert len(world.roads) != 0
+
+def test_start_city_fails_without_a_road(make_world):
+    world = make_world()
+    property_agents, road_agent = makeAgents(world)
+    with pytest.raises(RuntimeError):
+        startCity(world, *property_agents, road_agent=road_agent, road_attempts=0)
+    assert len(world.roads) == 0
+
+# Searches that always fail, recording their deadlines
+def failSearches(world):
+    deadlines = []
+    def findPath(start, dest, extra_goals=[], incremental=False, **budget):
+        deadlines.append(budget.get('deadline'))
+        return []
+    world.road_graph.findPath = findPath
+    return deadlines
+
+def test_timed_start_retries_within_the_budget(make_world):
+    world = make_world()
+    property_agents, road_agent = makeAgents(world)
+    deadlines = failSearches(world)
+    start = time.perf_counter()
+    with pytest.raises(NoRoadError):
+        buildCityTimed(world, *property_agents, road_agent=road_agent, budget=1, steps=5, commit_reserve=0, road_attempts=3)
+    end = time.perf_counter()
+
+    # The retries without the search time limit still end with the budget
+    retried = [deadline for deadline in deadlines if deadline != None]
+    assert len(retried) == 3
+    assert all(start + 1 <= deadline <= end + 1 for deadline in retried)
+
+def test_regions_without_a_road_are_empty(make_world, monkeypatch):
+    world = make_world()
+    failSearches(world)
+    monkeypatch.setattr(regions, 'World', lambda *args, **kwargs: world)
+    result = regions.simulateRegion((0, 0, 99, 99), 0, 255, 5, 3, 5, None, 0)
+    assert result == {'roads': [], 'road_paths': [], 'road_edges': [], 'parcels': []}
+
+def test_incremental_connect_keeps_one_network_planner(make_world):
+    world = make_world()
+    property_agents, road_agent = makeAgents(world)
+    road_agent.incremental = True
+    startCity(world, *property_agents, road_agent=road_agent)
+    planners = []
+    for tick in range(3):
+        for agent in property_agents:
+            agent.buildNew()
+        road_agent.connect()
+        planners.append(world.road_graph.network_planner)
+    assert road_agent.connected != 0
+    assert all(parcel.connected for parcel in world.parcels[1:])
+    assert planners[0] != None and all(planner is planners[0] for planner in planners)
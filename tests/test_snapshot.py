@@ -0,0 +1,32 @@
+import pickle
+
+from strabo.agents.property import PropertyDeveloper
+from strabo.agents.road import RoadDeveloper
+from strabo.simulation import buildCity
+
+# Patch attributes and world arrays, as bytes
+def dumpWorld(world):
+    patches = [{name: value for name, value in vars(patch).items() if name != 'parcel'} for patch in world.patches.flatten()]
+    return pickle.dumps((patches, world.parcel_ids, world.parcel_types, world.developable, world.version))
+
+def test_scoring_a_snapshot_leaves_the_world_unchanged(make_world):
+    world = make_world()
+    agents = [PropertyDeveloper(world, agent_type) for agent_type in ["Vr", "Vc", "Vi"]]
+    buildCity(world, *agents, road_agent=RoadDeveloper(world, explorers=5), steps=3)
+    for agent in agents:
+        for patch in world.patches.flatten():
+            agent.getScore(patch)
+    before = dumpWorld(world)
+
+    # A new market in the snapshot changes the proximity to market of the patches around it
+    snapshot = world.fork()
+    free = [patch for patch in world.patches.flatten() if patch.developable and world.parcel_ids[patch.i, patch.j] == 0]
+    assert snapshot.claimParcel([free[0]], None, 'Vc') != None
+    for agent in agents:
+        for patch in world.patches.flatten():
+            agent.getScore(patch, snapshot)
+
+    position = (free[0].i, free[0].j)
+    assert snapshot.getPatchFeature(position, 'dcom') == 0
+    assert world.patches[position].dcom != 0
+    assert dumpWorld(world) == before
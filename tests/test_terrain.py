@@ -0,0 +1,38 @@
+import numpy as np
+
+from strabo.agents.property import PropertyDeveloper
+from strabo.roadnet import RoadNet
+
+class FlatPatch:
+    y = 64
+
+def test_roads_avoid_costly_terrain():
+    patches = np.array([[FlatPatch() for j in range(9)] for i in range(9)], dtype=object)
+    steep = np.zeros((9, 9), dtype=bool)
+    terrain_cost = np.zeros((9, 9))
+    terrain_cost[4, :] = 10 # A cliff across the map, with a gentle pass at the edge
+    terrain_cost[4, 8] = 0
+
+    plain = RoadNet(patches, steep=steep).findPathAStar((0, 4), (8, 4))
+    path = RoadNet(patches, steep=steep, terrain_cost=terrain_cost).findPathAStar((0, 4), (8, 4))
+    assert (4, 4) in plain
+    assert (4, 8) in path and (4, 4) not in path
+
+def test_cliffs_raise_road_costs(make_world):
+    x, z = np.mgrid[0:101, 0:101]
+    heightmap = 64 + 3*(x >= 50) # A 3 block cliff
+    world = make_world(heightmap=heightmap, blocks=np.full(heightmap.shape, 'minecraft:grass_block', dtype=object))
+    cliff = world.layers['cliff'] > 0
+    assert cliff.any()
+    assert (world.road_graph.terrain_cost[cliff] > 0).all()
+    assert (world.road_graph.terrain_cost[~cliff] == 0).all()
+
+def test_scores_favour_flat_terrain(make_world):
+    world = make_world()
+    agent = PropertyDeveloper(world, "Vi")
+    patch = world.patches[10, 10]
+    flat_score = agent.getScore(patch)["Vi"]
+
+    patch.flatness, patch.roughness = patch.flatness/2, patch.roughness + 2
+    world.version += 1
+    assert agent.getScore(patch)["Vi"] < flat_score
@@ -0,0 +1,24 @@
+from strabo.patch import PATCH_TYPES
+
+def test_update_water_changes_where_can_be_built(make_world):
+    world = make_world()
+    patch = world.patches[15, 2]
+    assert patch.type == 'land' and patch.developable
+    index = world.getAvailability('Vr', lambda p: 1.0 if p is patch else 0.0)
+    assert index.top(1) == [patch]
+
+    # Flooded: nothing can be built there, and roads go around it
+    patch.type = 'water'
+    world.updateWater([patch])
+    assert not patch.developable and not world.developable[15, 2]
+    assert PATCH_TYPES[world.layers['types'][15, 2]] == 'water'
+    assert (15, 2) in world.road_graph.blocked
+    assert world.getFootprints()[15, 2] < 0
+    assert patch not in index.top(5)
+
+    # Drained: available again
+    patch.type = 'land'
+    world.updateWater([patch])
+    assert patch.developable and world.developable[15, 2]
+    assert PATCH_TYPES[world.layers['types'][15, 2]] == 'land'
+    assert index.top(1) == [patch]